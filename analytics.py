@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from progress import MILESTONE_WEIGHTS
+from projects import changed_rows, day_number, project_identity
+
+
+# ==============================================
+# 統計頁：預先加總好的 rollup（存檔後只重算有改動的專案）
+# ==============================================
+MILESTONES = list(MILESTONE_WEIGHTS.index)
+# 階段 = 相鄰兩個里程碑之間的天數（以結束的里程碑命名）
+STAGES = {"Installation": ("Parts_Arrival", "Installation_Complete"),
+          "Testing": ("Installation_Complete", "Testing_Complete"),
+          "Cleaning": ("Testing_Complete", "Cleaning_Complete"),
+          "Delivery": ("Cleaning_Complete", "Delivery_Complete")}
+# 改了這些欄位，專案對 rollup 的貢獻才會變（Project_ID 是 index，不用 hash）
+SOURCE_COLUMNS = ["Year", "Project_Type", "Supervisor", "Qty", "Lead_Time"] + MILESTONES
+# 每個階段：天數總和 / 平方和（算標準差）/ 完成數目
+STAGE_COLUMNS = [c for s in STAGES for c in (f"{s}_days", f"{s}_sq", f"{s}_n")]
+# rollup 名稱 -> (group by 的欄位, 加總的欄位)
+ROLLUPS = {
+    "delivered": (["Year", "Delivered_Month", "Project_Type"], ["delivered", "delivered_qty"]),
+    "schedule": (["Year", "Project_Type"], ["projects", "on_time", "late", "late_days", "overdue", "open"] + STAGE_COLUMNS),
+    "supervisor": (["Year", "Supervisor"], ["projects", "qty", "open", "open_qty", "overdue"]),
+}
+
+
+def contributions(frame, today):
+    """每個專案對各 rollup 的貢獻（一個專案一行）。
+
+    里程碑日期早於今天才算完成（跟 progress 一樣）；交貨日期晚過 Lead_Time 算遲交。
+    """
+    return pd.DataFrame(_contributions(frame, today))
+
+
+def _contributions(frame, today, positions=None):
+    """contributions 的欄位（dict of numpy array，positions 是只要的 row 位置）：
+    只有幾個專案時不用建 DataFrame。"""
+    def column(c, **kwargs):
+        values = frame[c].to_numpy(**kwargs)
+        return values if positions is None else values[positions]
+
+    t = day_number(today)
+    days = {c: column(c, dtype="float64", na_value=np.nan) for c in MILESTONES + ["Lead_Time"]}
+    done = {c: days[c] < t for c in MILESTONES}
+    delivered = done["Delivery_Complete"]
+    lead = days["Lead_Time"]
+    late = delivered & (days["Delivery_Complete"] > lead)
+    qty = column("Qty", dtype="int64")
+    # 交貨月份：1970-01 起的月數（沒有交貨是 -1），顯示時才換成 YYYY-MM
+    month = np.nan_to_num(days["Delivery_Complete"]).astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    out = {
+        "Year": column("Year"),
+        "Project_Type": column("Project_Type").astype(str),
+        "Supervisor": column("Supervisor").astype(str),
+        "Delivered_Month": np.where(delivered, month, -1),
+        "projects": np.ones(len(qty), dtype="int64"),
+        "qty": qty,
+        "delivered": delivered.astype("int64"),
+        "delivered_qty": qty * delivered,
+        "on_time": (delivered & ~late).astype("int64"),
+        "late": late.astype("int64"),
+        "late_days": np.where(late, days["Delivery_Complete"] - lead, 0.0),
+        "overdue": (~delivered & (lead < t)).astype("int64"),
+        "open": (~delivered).astype("int64"),
+        "open_qty": qty * ~delivered,
+    }
+    for stage, (start, end) in STAGES.items():
+        ok = done[end] & ~np.isnan(days[start])
+        out[f"{stage}_days"] = np.where(ok, days[end] - days[start], 0.0)
+        out[f"{stage}_sq"] = out[f"{stage}_days"] ** 2
+        out[f"{stage}_n"] = ok.astype("int64")
+    return out
+
+
+def _sum(rows, name):
+    # 一律 float64：_apply 直接改 numpy 值，不用每欄換回原本的型別
+    keys, values = ROLLUPS[name]
+    return rows.groupby(keys, observed=True)[values].sum().astype("float64")
+
+
+def _apply(table, name, before, after):
+    """rollup 表減掉 before、加上 after 的貢獻（_contributions 的結果），直接改對應的行
+    （不用 groupby 再對齊整個表）。"""
+    keys, values = ROLLUPS[name]
+    delta = {}
+    for sign, rows in ((-1, before), (1, after)):
+        matrix = np.column_stack([rows[c] for c in values]).astype("float64") * sign
+        for key, row in zip(zip(*(rows[c] for c in keys)), matrix):
+            delta[key] = delta[key] + row if key in delta else row
+    position = {key: i for i, key in enumerate(table.index)}
+    out = table.to_numpy(dtype="float64", copy=True)
+    new = []
+    for key, row in delta.items():
+        if key in position:
+            out[position[key]] += row
+        else:
+            new.append(key)
+    index = table.index
+    if new:
+        out = np.vstack([out] + [delta[k] for k in new])
+        index = index.append(pd.MultiIndex.from_tuples(new, names=keys))
+    # 沒有專案的組合拿掉
+    keep = (out != 0).any(axis=1)
+    if not keep.all():
+        out, index = out[keep], index[keep]
+    return pd.DataFrame(out, index=index, columns=table.columns)
+
+
+def _by_year(table, year, keys):
+    if year is not None:
+        table = table[table.index.get_level_values("Year") == year]
+    return table.groupby(level=keys).sum()
+
+
+class Rollups:
+    """一份 projects 的統計：delivered（每月 / 類型交貨數量）、schedule（準時 / 遲交 / 各階段天數）、
+    supervisor（每位負責人手上的專案）。
+
+    updated() 回傳新的 Rollups：用 Project_ID 對應新舊兩份資料，只把有改動（新增 / 刪除 / 相關欄位有變）
+    的專案減掉舊的貢獻、加上新的（改動太多就整份重算，見 projects.changed_rows）。原本那份不變，其他 session 可以繼續用。
+    frame 是 snapshot 裡共用的 df（只保留參照，不複製）。
+    """
+
+    def __init__(self, frame, today, tables=None, identity=None):
+        self.today = today
+        self.frame = frame
+        self.ids, self.hashes = identity or project_identity(frame, SOURCE_COLUMNS)
+        if tables is None:
+            rows = contributions(frame, today)
+            tables = {name: _sum(rows, name) for name in ROLLUPS}
+        self.tables = tables
+
+    def updated(self, frame, today):
+        identity = project_identity(frame, SOURCE_COLUMNS)
+        diff = changed_rows((self.ids, self.hashes), identity) if today == self.today else None
+        if diff is None:
+            # 日期變了（完成 / 過期的判斷跟著變）、ID 重複或改動太多：整份重算
+            return Rollups(frame, today, identity=identity)
+        _, _, added, removed = diff
+        if len(added) == 0 and len(removed) == 0:
+            return Rollups(frame, today, self.tables, identity)
+
+        before, after = _contributions(self.frame, today, removed), _contributions(frame, today, added)
+        return Rollups(frame, today, {name: _apply(table, name, before, after)
+                                      for name, table in self.tables.items()}, identity)
+
+    # ---------- 給統計頁用（year=None 是全部年份） ----------
+    def delivered_by_month(self, year=None):
+        """每月交貨數量（row = 月份，column = Project_Type）。"""
+        table = _by_year(self.tables["delivered"], year, ["Delivered_Month", "Project_Type"])
+        table = table[table.index.get_level_values("Delivered_Month") >= 0]
+        out = table["delivered_qty"].unstack("Project_Type", fill_value=0).sort_index().astype(int)
+        out.index = out.index.to_numpy().astype("datetime64[M]").astype(str)
+        out.index.name = "Month"
+        return out
+
+    def schedule(self, year=None):
+        """每個 Project_Type 的準時 / 遲交 / 過期未交數目和平均遲交天數（最後一行是全部）。"""
+        table = _by_year(self.tables["schedule"], year, ["Project_Type"])
+        table.loc["All"] = table.sum()
+        out = table[["projects", "on_time", "late", "overdue", "open"]].astype(int)
+        out["avg_days_late"] = (table["late_days"] / table["late"].where(table["late"] > 0)).round(1)
+        return out
+
+    def stage_days(self, year=None):
+        """每個 Project_Type 各階段的平均天數（最後一行是全部）。"""
+        table = _by_year(self.tables["schedule"], year, ["Project_Type"])
+        table.loc["All"] = table.sum()
+        return pd.DataFrame({stage: (table[f"{stage}_days"] / table[f"{stage}_n"].where(table[f"{stage}_n"] > 0)).round(1)
+                             for stage in STAGES})
+
+    def supervisor_load(self, year=None):
+        """每位負責人的專案數、數量，和未交貨 / 過期的專案（依未交貨數量排序）。"""
+        table = _by_year(self.tables["supervisor"], year, ["Supervisor"]).astype(int)
+        table = table.rename(index={"": "(none)"})
+        return table.sort_values(["open_qty", "open"], ascending=False)
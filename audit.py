@@ -0,0 +1,92 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from persistence import same_value, to_cell
+
+
+# ==============================================
+# 改動記錄（append-only）：誰、什麼時候、改了哪個專案的哪個欄位
+# ==============================================
+AUDIT_COLUMNS = ["Timestamp", "User", "Project_ID", "Project_Name", "Action", "Field", "Old", "New"]
+# 不記錄的欄位（每次寫入都會變）
+SKIP_FIELDS = {"Revision"}
+
+
+def _record_json(record, columns):
+    return json.dumps({c: to_cell(record.get(c)) for c in columns if c not in SKIP_FIELDS},
+                      ensure_ascii=False, default=str)
+
+
+def audit_entries(changes, columns, conflicts=()):
+    """一次存檔的 ChangeSet -> 改動記錄（list of dict，AUDIT_COLUMNS）。
+
+    update 每個有改的欄位一行（舊值取 base）；add / delete 一行，New / Old 是整筆記錄的 JSON
+    （delete 的 base 要帶整筆記錄，還原舊資料時用）。沒寫入的衝突欄位 / 專案不記錄（撞名的整筆沒寫入）。
+    """
+    skipped = {(c["key"], None if c.get("duplicate") else c["field"]) for c in conflicts}
+    entries = []
+    now = datetime.now().isoformat(timespec="milliseconds")
+
+    def entry(key, record, action, field="", old="", new=""):
+        when, user = changes.stamps.get(key) or (now, "")
+        entries.append({"Timestamp": when, "User": user, "Project_ID": key,
+                        "Project_Name": to_cell(record.get("Project_Name")), "Action": action,
+                        "Field": field, "Old": old, "New": new})
+
+    for key, record in changes.added.items():
+        if (key, None) in skipped:
+            continue
+        entry(key, record, "add", new=_record_json(record, columns))
+    for key, (record, fields) in changes.updated.items():
+        base = changes.base.get(key, {})
+        if (key, None) in skipped:
+            continue
+        for f in fields if fields is not None else columns:
+            if f in SKIP_FIELDS or (key, f) in skipped or f not in record:
+                continue
+            old, new = to_cell(base.get(f)), to_cell(record.get(f))
+            if f in base and same_value(old, new):
+                continue
+            entry(key, {**base, **record}, "update", f, old, new)
+    for key in changes.deleted:
+        if (key, None) in skipped:
+            continue
+        base = changes.base.get(key, {})
+        entry(key, base, "delete", old=_record_json(base, columns))
+    return entries
+
+
+def as_of(projects_raw, log, when, columns):
+    """目前的 projects（原始格式）+ when 之後的改動記錄 -> when 當時的 projects。
+
+    從目前的資料往回倒推（update 換回舊值、add 拿掉、delete 加回來），
+    只用得到 when 之後的記錄，不用從頭重播整份歷史。
+    """
+    when = pd.Timestamp(when).isoformat()
+    log = log[log["Timestamp"].astype(str) > when]
+    frame = projects_raw.astype(object)
+    if log.empty:
+        return frame
+    records = dict(zip(frame["Project_ID"], frame.to_dict("records")))
+    # 同一個時間的記錄照寫入次序：倒過來撤銷
+    for e in reversed(log.sort_values("Timestamp", kind="stable").to_dict("records")):
+        pid = e["Project_ID"]
+        if e["Action"] == "update":
+            if pid in records:
+                records[pid][e["Field"]] = e["Old"]
+        elif e["Action"] == "add":
+            records.pop(pid, None)
+        elif e["Action"] == "delete":
+            restored = json.loads(e["Old"]) if e["Old"] else {}
+            records[pid] = {**{c: np.nan for c in columns}, **restored, "Project_ID": pid}
+    return pd.DataFrame(list(records.values()), columns=list(frame.columns))
+
+
+def project_history(log, project_id):
+    """一個專案的改動（新的在前），給 Details 的 History 用。"""
+    rows = log[log["Project_ID"] == project_id]
+    return rows.sort_values("Timestamp", ascending=False, kind="stable")[
+        ["Timestamp", "User", "Action", "Field", "Old", "New"]].reset_index(drop=True)
@@ -0,0 +1,133 @@
+import time
+
+import pandas as pd
+
+
+# ==============================================
+# 本機版 GSheetsConnection（可設定每次 API 呼叫的延遲）
+# ==============================================
+class FakeWorksheet:
+    """模擬 gspread Worksheet 中 SheetTable 會用到的方法；每次呼叫算一次 API call。"""
+
+    def __init__(self, conn, name):
+        self._conn = conn
+        self.name = name
+
+    @property
+    def _frame(self):
+        return self._conn.sheets[self.name]
+
+    def row_values(self, row):
+        self._conn._call()
+        if row == 1:
+            return list(self._frame.columns)
+        return [str(v) for v in self._frame.iloc[row - 2].tolist()]
+
+    def col_values(self, col):
+        self._conn._call()
+        frame = self._frame
+        return [frame.columns[col - 1]] + frame.iloc[:, col - 1].astype(str).tolist()
+
+    def batch_get(self, ranges, major_dimension="ROWS", **kwargs):
+        # 只支援 SheetTable 用的整欄範圍（"C2:C"，major_dimension="COLUMNS"）
+        self._conn._call()
+        frame = self._frame
+        out = []
+        for item in ranges:
+            letters = "".join(ch for ch in item.split(":")[0] if ch.isalpha())
+            col = 0
+            for ch in letters:
+                col = col * 26 + ord(ch) - 64
+            values = frame.iloc[:, col - 1].astype(str).tolist() if col <= frame.shape[1] else []
+            out.append([values])
+        return out
+
+    def get(self, range_name, **kwargs):
+        # "A5:H" / "A1:B2"：一個長方形範圍的 row（跟 gspread 一樣，尾巴的空 row 不回傳）
+        self._conn._call()
+        frame = self._frame
+        bounds = []
+        for part in range_name.split(":"):
+            letters = "".join(ch for ch in part if ch.isalpha())
+            col = 0
+            for ch in letters:
+                col = col * 26 + ord(ch) - 64
+            bounds.append((int(part[len(letters):]) if part[len(letters):] else None, col))
+        (r1, c1), (r2, c2) = bounds
+        # 第 1 行是標題
+        header = [list(frame.columns)] if r1 == 1 else []
+        start = max(r1 - 2, 0)
+        end = len(frame) if r2 is None else r2 - 1
+        body = frame.iloc[start:end, c1 - 1:c2].fillna("").astype(str).values.tolist()
+        return (header + body)[:None if r2 is None else r2 - r1 + 1]
+
+    def update(self, range_name=None, values=None, **kwargs):
+        # 只支援 SheetTable 補標題（第 1 行）
+        self._conn._call()
+        frame = self._frame
+        for name in values[0] if range_name.endswith("1") and range_name[-2:-1].isalpha() else []:
+            if name not in frame.columns:
+                frame[name] = pd.Series("", index=frame.index, dtype=object)
+
+    def batch_update(self, data, **kwargs):
+        self._conn._call()
+        frame = self._frame
+        for item in data:
+            start = item["range"].split(":")[0]
+            letters = "".join(ch for ch in start if ch.isalpha())
+            row = int(start[len(letters):])
+            col = 0
+            for ch in letters:
+                col = col * 26 + ord(ch) - 64
+            for offset, value in enumerate(item["values"][0]):
+                frame.iat[row - 2, col - 1 + offset] = value
+
+    def append_rows(self, values, **kwargs):
+        self._conn._call()
+        frame = self._frame
+        extra = pd.DataFrame(values, columns=frame.columns[:len(values[0])])
+        self._conn.sheets[self.name] = pd.concat([frame, extra], ignore_index=True)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._conn._call()
+        frame = self._frame
+        drop = frame.index[start_index - 2:(end_index or start_index) - 1]
+        self._conn.sheets[self.name] = frame.drop(drop).reset_index(drop=True)
+
+
+class _FakeClient:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _select_worksheet(self, worksheet=None, **kwargs):
+        if worksheet not in self._conn.sheets:
+            # gspread 會丟 WorksheetNotFound
+            raise KeyError(worksheet)
+        return FakeWorksheet(self._conn, worksheet)
+
+
+class FakeGSheetsConnection:
+    """read / update / client 跟 streamlit_gsheets.GSheetsConnection 一樣用法，資料放在記憶體。"""
+
+    def __init__(self, sheets, latency=0.0):
+        # 儲存格沒有型別：一律用 object 欄位
+        self.sheets = {name: frame.astype(object) for name, frame in sheets.items()}
+        self.latency = latency
+        self.api_calls = 0
+        self.client = _FakeClient(self)
+
+    def _call(self):
+        self.api_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read(self, worksheet=None, usecols=None, ttl=None, **kwargs):
+        self._call()
+        frame = self.sheets[worksheet]
+        frame = frame.iloc[:, usecols] if usecols is not None else frame
+        # Google Sheets 讀回來的是文字 / 數字，空格是 NaN
+        return frame.replace("", float("nan")).copy()
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        self._call()
+        self.sheets[worksheet] = data.copy()
@@ -0,0 +1,227 @@
+"""離線效能測試。
+
+    python -m benchmarks.run                       # 100 / 1k / 10k / 50k rows
+    python -m benchmarks.run --sizes 1000 --latency 200 --out bench.jsonl
+    python -m benchmarks.run --compare bench.jsonl  # 跟上次結果比較，變慢超過門檻就 exit 1
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+from analytics import Rollups
+from benchmarks.fake_gsheets import FakeGSheetsConnection
+from benchmarks.synthetic import make_checklists, make_projects
+from bulk_io import export_projects, import_projects
+from checklist import ChecklistStore
+from forecast import forecast
+from offline import read_frame, write_frame
+from persistence import ChangeSet
+from progress import with_progress
+from projects import parse_projects
+from query import ProjectQuery
+from search import SearchIndex
+from snapshot import SnapshotStore
+from storage import GSheetsBackend, SQLiteBackend
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+
+def timed(fn, repeat, setup=None):
+    """執行 repeat 次，回傳每次的毫秒數（setup 不計時）。"""
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+
+def result(bench, rows, samples, **extra):
+    return {"bench": bench, "rows": rows, "median_ms": round(statistics.median(samples), 3),
+            "min_ms": round(min(samples), 3), "max_ms": round(max(samples), 3), "repeat": len(samples), **extra}
+
+
+def bench_size(n, repeat, latency, apptest):
+    today = date.today()
+    raw_projects = make_projects(n, seed=n)
+    raw_checklist = make_checklists(raw_projects["Project_Name"], seed=n)
+    sheets = {"projects": raw_projects, "checklist": raw_checklist}
+    out = []
+
+    # 讀取（冷快取，含模擬延遲）+ 解析
+    conn = FakeGSheetsConnection(sheets, latency=latency)
+    backend = GSheetsBackend(conn, ttl=3600)
+
+    def cold_backend():
+        backend.refresh()
+        return backend
+
+    out.append(result("load_projects", n, timed(lambda b: b.read_projects(), repeat, cold_backend)))
+    out.append(result("load_checklist", n, timed(lambda b: b.read_checklist(), repeat, cold_backend)))
+    projects_read = backend.read_projects()
+    out.append(result("load_cached", n, timed(backend.read_projects, repeat)))
+    checklist_read = backend.read_checklist()
+    # 離線快取：寫入本機 Arrow 檔 / 開機時從本機讀回（不經網路）
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "projects.arrow")
+        out.append(result("offline_write", n, timed(lambda: write_frame(projects_read, path), repeat)))
+        out.append(result("offline_read", n, timed(lambda: read_frame(path), repeat)))
+    out.append(result("parse_projects", n, timed(lambda: parse_projects(projects_read, today), repeat)))
+    out.append(result("parse_checklist", n, timed(lambda: ChecklistStore.from_sheet(checklist_read), repeat)))
+
+    # 進度 + 篩選
+    df = parse_projects(projects_read, today)
+    checklists = ChecklistStore.from_sheet(checklist_read)
+    out.append(result("progress", n, timed(lambda: checklists.with_status(with_progress(df, today)), repeat)))
+    all_df = checklists.with_status(with_progress(df, today))
+    out.append(result("query_build", n, timed(lambda: ProjectQuery(all_df), repeat)))
+    out.append(result("search_build", n, timed(lambda: SearchIndex(df, checklists), repeat)))
+    query = ProjectQuery(all_df, SearchIndex(df, checklists))
+    out.append(result("filter_all", n, timed(lambda: all_df.iloc[query.select(year=today.year, project_type="Enclosure")], repeat)))
+    out.append(result("filter_delay", n, timed(lambda: all_df.iloc[query.overdue(today)], repeat)))
+    out.append(result("filter_text", n, timed(lambda: all_df.iloc[query.select(text="dse8610")], repeat)))
+    out.append(result("filter_text_cjk", n, timed(lambda: all_df.iloc[query.select(text="報價")], repeat)))
+
+    # 共用 snapshot：第一個 session 讀取 + 解析，其他 session 直接拿同一份
+    snapshots = SnapshotStore(backend, max_age=3600)
+
+    def stale_snapshots():
+        snapshots.invalidate()
+        return snapshots
+
+    out.append(result("snapshot_build", n, timed(lambda s: s.get(today), repeat, stale_snapshots)))
+    out.append(result("snapshot_hit", n, timed(lambda: snapshots.get(today), repeat)))
+
+    # 統計 rollup：整份建立 vs 改了一個專案之後的增量更新
+    out.append(result("rollups_build", n, timed(lambda: Rollups(df, today), repeat)))
+    rollups = Rollups(df, today)
+    edited = projects_read.copy()
+    edited.iloc[n // 2, edited.columns.get_loc("Supervisor")] = "bench"
+    edited_df = parse_projects(edited, today)
+    out.append(result("rollups_update", n, timed(lambda: rollups.updated(edited_df, today), repeat)))
+    out.append(result("forecast", n, timed(lambda: forecast(df, rollups, today), repeat)))
+
+    # 大量匯出 / 匯入（CSV，只驗證，不存檔）
+    out.append(result("export_csv", n, timed(lambda: export_projects(df, "csv"), repeat)))
+    exported = export_projects(df, "csv")
+    editable = [c for c in raw_projects.columns if c not in ("Project_ID", "Revision")]
+    out.append(result("import_csv", n, timed(lambda: import_projects(io.BytesIO(exported), "bench.csv", editable,
+                                                                     raw_projects["Project_Type"].unique(),
+                                                                     raw_projects["Year"].unique()), repeat)))
+
+    # 存檔（一個專案改兩格 / 一份 checklist），計算 API 呼叫次數
+    names = raw_projects["Project_Name"].tolist()
+    target = raw_projects.iloc[n // 2]
+
+    def one_edit():
+        # 版本號跟 sheet 上的一樣（不衝突）：每次都重新讀 base
+        changes = ChangeSet()
+        current = conn.sheets["projects"].iloc[n // 2]
+        changes.update(target["Project_ID"], {"Project_Name": target["Project_Name"], "Qty": 7, "Progress_Reminder": "bench"},
+                       ["Qty", "Progress_Reminder"], base={"Revision": current["Revision"], "Qty": current["Qty"],
+                                                          "Progress_Reminder": current["Progress_Reminder"]})
+        return changes
+
+    calls = conn.api_calls
+    out.append(result("save_projects", n, timed(backend.save_projects, repeat, one_edit),
+                      api_calls=(conn.api_calls - calls) / repeat))
+
+    def one_checklist():
+        changes = ChangeSet()
+        changes.update(names[0], {"Project_Name": names[0], "Checklist_Data": raw_checklist["Checklist_Data"].iloc[0]})
+        return changes
+
+    calls = conn.api_calls
+    out.append(result("save_checklist", n, timed(backend.save_checklist, repeat, one_checklist),
+                      api_calls=(conn.api_calls - calls) / repeat))
+
+    if apptest:
+        out.extend(bench_apptest(n, raw_projects, raw_checklist, repeat))
+    return out
+
+
+def bench_apptest(n, raw_projects, raw_checklist, repeat):
+    """用 Streamlit AppTest 跑整個 app（本機 SQLite 後端），量一次 rerun 的時間。"""
+    from streamlit.testing.v1 import AppTest
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="dashboard-bench-"), "bench.db")
+    store = SQLiteBackend(db_path)
+    changes = ChangeSet()
+    for record in raw_projects.to_dict("records"):
+        changes.add(record["Project_ID"], record)
+    store.save_projects(changes)
+    changes = ChangeSet()
+    for record in raw_checklist.to_dict("records"):
+        changes.add(record["Project_Name"], record)
+    store.save_checklist(changes)
+
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    at.secrets["dashboard"] = {"backend": "sqlite", "sqlite_path": db_path, "write_behind": False}
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"app failed: {at.exception[0].message}")
+    out = [result("apptest_rerun_all", n, timed(at.run, repeat))]
+    at.button(key="btn_delay").click().run()
+    out.append(result("apptest_rerun_delay", n, timed(at.run, repeat)))
+    return out
+
+
+def compare(results, baseline_path, threshold):
+    """印出跟 baseline 的比較，回傳變慢超過 threshold 倍的項目數。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["bench"], r["rows"], r.get("latency_ms")): r for r in map(json.loads, f) if r.get("bench")}
+    regressions = 0
+    print(f"\n{'bench':<22}{'rows':>8}{'before':>12}{'after':>12}{'ratio':>8}")
+    for r in results:
+        old = baseline.get((r["bench"], r["rows"], r.get("latency_ms")))
+        if not old:
+            continue
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = "  <-- slower" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['bench']:<22}{r['rows']:>8}{old['median_ms']:>12.2f}{r['median_ms']:>12.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the project dashboard")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated latency per Sheets API call (ms)")
+    parser.add_argument("--no-apptest", action="store_true", help="skip the full-app AppTest reruns")
+    parser.add_argument("--out", help="append results to this JSON lines file")
+    parser.add_argument("--compare", help="JSON lines file from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    env = {"python": platform.python_version(), "pandas": pd.__version__, "latency_ms": args.latency,
+           "ts": time.time()}
+    results = []
+    for n in args.sizes:
+        for r in bench_size(n, args.repeat, args.latency / 1000, not args.no_apptest):
+            r.update(env)
+            results.append(r)
+            print(f"{r['bench']:<22}{n:>8}{r['median_ms']:>12.2f} ms" +
+                  (f"  ({r['api_calls']:.0f} API calls)" if "api_calls" in r else ""))
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from persistence import name_project_id
+from storage import PROJECT_COLUMNS
+
+
+# ==============================================
+# 假資料：projects / checklist（格式跟 Google Sheets 讀回來一樣）
+# ==============================================
+PROJECT_TYPES = ["Enclosure", "Open Set", "Scania", "Marine", "K50G3"]
+TYPE_WEIGHTS = [0.4, 0.25, 0.15, 0.1, 0.1]
+GENSETS = ["C110D5", "C220D5", "C500D5", "KTA50-G3", "DC13 072A", "S6R2-PTA"]
+ALTERNATORS = ["Stamford UCI274", "Stamford HCI544", "Leroy Somer TAL046", "Meccalte ECO38"]
+CONTROLLERS = ["DSE7320", "DSE8610", "ComAp IL-NT", "Deepsea 4520"]
+REMINDERS = ["", "", "", "等緊報價", "生產中", "已發貨", "Waiting parts", "QC"]
+# 各階段平均天數：到料 -> 安裝 -> 測試 -> 清潔 -> 交貨
+STAGE_DAYS = [30, 20, 7, 4, 5]
+
+
+def _fmt(dates):
+    return pd.Series(dates).dt.strftime("%Y-%m-%d").fillna("").to_numpy()
+
+
+def make_projects(n, seed=0, today=None):
+    """n 個專案；交貨期分佈在 2024 至 2026，今天以前的里程碑大多已填日期。"""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    years = rng.choice([2024, 2025, 2026], size=n, p=[0.25, 0.45, 0.3])
+    lead = pd.to_datetime([f"{y}-01-01" for y in years]) + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+
+    # 由交貨期往回推各階段日期；未來的階段有一半還沒填
+    stages = np.cumsum(rng.gamma(2.0, np.array(STAGE_DAYS) / 2.0, size=(n, len(STAGE_DAYS)))[:, ::-1], axis=1)[:, ::-1]
+    milestone_cols = ["Parts_Arrival", "Installation_Complete", "Testing_Complete", "Cleaning_Complete", "Delivery_Complete"]
+    slip = rng.integers(-10, 20, n)
+    milestones = {}
+    for i, c in enumerate(milestone_cols):
+        d = lead - pd.to_timedelta(stages[:, i].astype(int) - slip, unit="D")
+        unknown = (d > today) & (rng.random(n) < 0.5)
+        milestones[c] = _fmt(d.where(~unknown))
+
+    qty = rng.integers(1, 6, n)
+    specs = [f"Genset model: {g}\nAlternator Model: {a}\nController: {c}\nCircuit breaker Size: {b}A\nCharger: {ch}A"
+             for g, a, c, b, ch in zip(rng.choice(GENSETS, n), rng.choice(ALTERNATORS, n), rng.choice(CONTROLLERS, n),
+                                       rng.choice([100, 250, 400, 630, 800, 1250], n), rng.choice([5, 10], n))]
+    names = [f"YS-{y}-{i:05d}" for i, y in enumerate(years)]
+    frame = pd.DataFrame({
+        "Project_Type": rng.choice(PROJECT_TYPES, n, p=TYPE_WEIGHTS),
+        "Project_Name": names,
+        "Year": years,
+        "Lead_Time": _fmt(lead),
+        "Customer": [f"Customer {k}" for k in rng.integers(0, max(5, n // 40), n)],
+        "Supervisor": rng.choice(["Ken", "Ah Wing", "May", "Tony", "陳生", "李生"], n),
+        "Qty": qty,
+        "Real_Count": qty,
+        "Project_Spec": specs,
+        "Description": rng.choice(["", "Container type", "Rental unit 出租機", "Special paint RAL7035"], n),
+        "Progress_Reminder": rng.choice(REMINDERS, n),
+        **milestones,
+        "Project_ID": [name_project_id(name) for name in names],
+        "Revision": rng.integers(1, 4, n),
+    })
+    return frame[PROJECT_COLUMNS]
+
+
+def make_checklists(names, seed=0, coverage=0.7):
+    """大約 coverage 比例的專案有 checklist（原始 worksheet 格式：Project_Name + JSON）。"""
+    rng = np.random.default_rng(seed + 1)
+    rows = []
+    for name in names:
+        if rng.random() > coverage:
+            continue
+        purchase = [f"PO-{k} {rng.choice(['radiator', 'ATS', 'battery', 'silencer', '油缸'])}" for k in range(rng.integers(0, 9))]
+        drawing = [f"DWG-{k} {rng.choice(['GA', 'wiring', 'foundation', '單線圖'])}" for k in range(rng.integers(0, 7))]
+        checklist = {"purchase": purchase, "done_p": [p for p in purchase if rng.random() < 0.6],
+                     "drawing": drawing, "done_d": [d for d in drawing if rng.random() < 0.5]}
+        rows.append({"Project_Name": name, "Checklist_Data": json.dumps(checklist, ensure_ascii=False)})
+    return pd.DataFrame(rows, columns=["Project_Name", "Checklist_Data"])
@@ -0,0 +1,226 @@
+import io
+
+import pandas as pd
+
+from persistence import ChangeSet, new_project_id
+from projects import DATE_COLUMNS, days_to_dates
+from storage import PROJECT_COLUMNS
+
+
+# ==============================================
+# 大量匯入 / 匯出 projects（CSV / Excel / Parquet，一次處理一塊）
+# ==============================================
+IMPORT_TYPES = ["csv", "xlsx", "parquet"]
+EXPORT_FORMATS = {"CSV": ("csv", "text/csv"),
+                  "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+                  "Parquet": ("parquet", "application/vnd.apache.parquet")}
+CHUNK_ROWS = 5000
+# 錯誤訊息最多保留幾條（檔案整份格式錯的時候不會列出幾萬行）
+MAX_ERRORS = 50
+
+
+def read_chunks(file, name, chunksize=CHUNK_ROWS):
+    """上傳的檔案 -> 一塊一塊的 DataFrame（每塊最多 chunksize 行），不會整份讀進記憶體。"""
+    ext = name.rsplit(".", 1)[-1].lower()
+    if ext == "csv":
+        # utf-8-sig：Excel 存的 CSV 開頭有 BOM
+        yield from pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunksize, encoding="utf-8-sig")
+    elif ext == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif ext == "xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = ["" if h is None else str(h).strip() for h in next(rows, ())]
+            batch = []
+            for row in rows:
+                batch.append((tuple(row) + (None,) * len(header))[:len(header)])
+                if len(batch) == chunksize:
+                    yield pd.DataFrame(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Unsupported file type: .{ext} (use {', '.join(IMPORT_TYPES)})")
+
+
+def _blank(values):
+    return values.isna() | (values.astype(str).str.strip() == "")
+
+
+def _to_dates(values):
+    """文字 / datetime -> Timestamp（空白或不是日期是 NaT）；先整欄用 YYYY-MM-DD 解析，其他寫法才逐格解析。"""
+    values = values.where(~_blank(values))
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = [pd.to_datetime(v, errors="coerce") for v in values[retry]]
+    return dates
+
+
+class ProjectImport:
+    """驗證、去重後要新增的專案（一個 ChangeSet，一次存檔寫入）。
+
+    columns 是檔案一定要有的欄位；Project_Type / Year 要是表單的選項之一（project_types / years）；
+    Project_Name 在檔案內重複只取第一行，
+    已經存在的專案不會覆蓋，列在 existing。
+    """
+
+    def __init__(self, columns, project_types, years, existing_names=()):
+        self.columns = [c for c in columns if c not in ("Project_ID", "Revision")]
+        self.project_types = set(project_types)
+        self.years = sorted(int(y) for y in years)
+        self.existing_names = set(existing_names)
+        self.changes = ChangeSet()
+        self.rows = 0
+        self.errors = []
+        self.invalid = 0
+        self.duplicates = []
+        self.existing = []
+        self._seen = set()
+
+    def _error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Row {line}: {message}")
+
+    def add_chunk(self, chunk):
+        chunk = chunk.rename(columns=lambda c: str(c).strip())
+        missing = [c for c in self.columns if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        # 檔案的行號：標題是第 1 行
+        lines = range(self.rows + 2, self.rows + 2 + len(chunk))
+        self.rows += len(chunk)
+        chunk = chunk.reset_index(drop=True)
+
+        # 整塊一起轉換 / 檢查，再逐行收集結果
+        text = {c: chunk[c].where(~_blank(chunk[c]), "").astype(str).str.strip().tolist()
+                for c in self.columns if c not in DATE_COLUMNS}
+        parsed = {c: _to_dates(chunk[c]) for c in DATE_COLUMNS}
+        bad_dates = pd.DataFrame({c: parsed[c].isna() & ~_blank(chunk[c]) for c in DATE_COLUMNS})
+        bad_rows = bad_dates.any(axis=1).tolist()
+        dates = {c: parsed[c].tolist() for c in DATE_COLUMNS}
+        year = pd.to_numeric(chunk["Year"], errors="coerce")
+        qty = pd.to_numeric(chunk["Qty"].where(~_blank(chunk["Qty"]), 1), errors="coerce")
+        real = pd.to_numeric(chunk["Real_Count"].where(~_blank(chunk["Real_Count"])), errors="coerce").fillna(qty)
+        year, qty, real = year.tolist(), qty.tolist(), real.tolist()
+
+        for i, line in enumerate(lines):
+            name = text["Project_Name"][i]
+            if not name:
+                self._error(line, "Project_Name is empty")
+                continue
+            if text["Project_Type"][i] not in self.project_types:
+                self._error(line, f"unknown Project_Type “{text['Project_Type'][i]}”")
+                continue
+            if pd.isna(year[i]) or year[i] != int(year[i]):
+                self._error(line, f"Year “{chunk['Year'][i]}” is not a number")
+                continue
+            if int(year[i]) not in self.years:
+                self._error(line, f"Year {int(year[i])} is not one of {', '.join(map(str, self.years))}")
+                continue
+            if pd.isna(dates["Lead_Time"][i]):
+                self._error(line, "Lead_Time is missing or not a date")
+                continue
+            if bad_rows[i]:
+                bad = [c for c in DATE_COLUMNS if bad_dates[c].iat[i]]
+                self._error(line, f"not a date: {', '.join(bad)}")
+                continue
+            if pd.isna(qty[i]) or qty[i] < 1 or pd.isna(real[i]):
+                self._error(line, "Qty / Real_Count must be a positive number")
+                continue
+            if name in self._seen:
+                self.duplicates.append(name)
+                continue
+            self._seen.add(name)
+            if name in self.existing_names:
+                self.existing.append(name)
+                continue
+            record = {c: text[c][i] for c in text}
+            record.update({c: dates[c][i] for c in DATE_COLUMNS})
+            record.update({"Year": int(year[i]), "Qty": int(qty[i]), "Real_Count": int(real[i]),
+                           "Project_ID": new_project_id()})
+            self.changes.add(record["Project_ID"], record)
+
+    def summary(self):
+        parts = [f"{len(self.changes)} new project(s) from {self.rows} row(s)"]
+        if self.duplicates:
+            parts.append(f"{len(self.duplicates)} duplicate name(s) in the file skipped")
+        if self.existing:
+            parts.append(f"{len(self.existing)} already in the dashboard skipped")
+        if self.invalid:
+            parts.append(f"{self.invalid} invalid row(s)")
+        return ", ".join(parts)
+
+
+def import_projects(file, name, columns, project_types, years, existing_names=(), chunksize=CHUNK_ROWS):
+    """讀取整個檔案（一次一塊），回傳 ProjectImport；格式錯（缺欄位 / 檔案類型）丟 ValueError。"""
+    result = ProjectImport(columns, project_types, years, existing_names)
+    for chunk in read_chunks(file, name, chunksize):
+        result.add_chunk(chunk)
+    return result
+
+
+# ---------- 匯出 ----------
+def export_chunks(frame, positions=None, chunksize=CHUNK_ROWS):
+    """parse 過的 projects（df / all_df）-> 存檔格式（日期是 YYYY-MM-DD 文字）的 DataFrame，一次一塊。
+
+    positions 是要匯出的 row 位置（目前的篩選 / 排序）；None 就是全部。
+    """
+    total = len(frame) if positions is None else len(positions)
+    # 沒有資料也輸出一塊（只有標題）
+    for start in range(0, max(total, 1), chunksize):
+        part = frame.iloc[start:start + chunksize] if positions is None \
+            else frame.iloc[positions[start:start + chunksize]]
+        out = part[PROJECT_COLUMNS].copy()
+        for c in DATE_COLUMNS:
+            out[c] = days_to_dates(out[c]).dt.strftime("%Y-%m-%d").fillna("")
+        for c in out.columns:
+            # category 每塊的代碼不一樣：換回文字，每塊的型別才會一致
+            if isinstance(out[c].dtype, pd.CategoricalDtype):
+                out[c] = out[c].astype(str)
+        yield out
+
+
+def write_export(chunks, fmt, out):
+    """把 export_chunks 一塊一塊寫進 out（binary file）。"""
+    if fmt == "csv":
+        for i, chunk in enumerate(chunks):
+            # 第一塊加 BOM，Excel 打開中文才不會亂碼
+            out.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8-sig" if i == 0 else "utf-8"))
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False,
+                                         schema=writer.schema if writer else None)
+            writer = writer or pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        if writer:
+            writer.close()
+    elif fmt == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("projects")
+        ws.append(PROJECT_COLUMNS)
+        for chunk in chunks:
+            # tolist() 會把 numpy 數字換成 Python 數字，openpyxl 才寫得進去
+            for row in chunk.astype(object).to_numpy().tolist():
+                ws.append(row)
+        wb.save(out)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def export_projects(frame, fmt, positions=None, chunksize=CHUNK_ROWS):
+    """匯出成檔案內容（bytes）：st.download_button 只收 bytes / str，反正也會整份讀進記憶體。"""
+    out = io.BytesIO()
+    write_export(export_chunks(frame, positions, chunksize), fmt, out)
+    return out.getvalue()
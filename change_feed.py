@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+# ==============================================
+# 即時更新：便宜地檢查資料有沒有變，有變才重新讀取
+# ==============================================
+# 只影響卡片顯示、不影響篩選 / 排序 / 計數的欄位；只改了這些可以直接更新卡片
+CARD_FIELDS = ["Progress_Reminder", "Description", "Parts_Arrival", "Installation_Complete",
+               "Testing_Complete", "Cleaning_Complete", "Revision"]
+
+
+class ChangeFeed:
+    """整個 process 共用：每 interval 秒最多問一次後端有沒有改動，不管有幾個 session 在看。
+
+    backend.change_token() 是很便宜的檢查（Google Sheets 讀 meta worksheet 兩格、SQLite 查 revisions），
+    token 變了 seq 加一（後端已經丟掉那個 worksheet 的快取）；session 比較 seq 決定要不要更新畫面。
+    後端不支援（change_token() 回傳 None）的話 seq 不會變。
+    """
+
+    def __init__(self, backend, interval=15.0):
+        self.backend = backend
+        self.interval = interval
+        self.seq = 0
+        self.last_error = None
+        self._token = None
+        self._polled = None
+        self._lock = threading.Lock()
+
+    def _due(self):
+        return self._polled is None or time.monotonic() - self._polled >= self.interval
+
+    def poll(self):
+        if not self._due():
+            return self.seq
+        with self._lock:
+            if not self._due():
+                return self.seq
+            self._polled = time.monotonic()
+            try:
+                token = self.backend.change_token()
+                self.last_error = None
+            except Exception as exc:
+                # 網路問題：先繼續顯示手上的資料，下一輪再試
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                return self.seq
+            if token is None:
+                return self.seq
+            if self._token is not None and token != self._token:
+                self.seq += 1
+            self._token = token
+        return self.seq
+
+
+def changed_projects(old, new, card_fields=CARD_FIELDS):
+    """比較兩份 parse 過的 projects（以 Project_ID 對應）。
+
+    回傳 (版本號有變的 Project_ID, 是否只改了 card_fields)；有新增 / 刪除也算不是。
+    """
+    old_rev = old.set_index("Project_ID")["Revision"]
+    new_rev = new.set_index("Project_ID")["Revision"]
+    if not new_rev.index.is_unique or not old_rev.index.is_unique \
+            or len(old_rev.index.symmetric_difference(new_rev.index)):
+        return list(new_rev.index), False
+    ids = new_rev.index[new_rev.ne(old_rev.reindex(new_rev.index))]
+    if len(ids) == 0:
+        return [], True
+    # 兩份資料的 category 不一樣不能直接比較，先轉成 object
+    before = old.set_index("Project_ID").loc[ids].astype(object)
+    after = new.set_index("Project_ID").loc[ids, before.columns].astype(object)
+    same = before.eq(after) | (before.isna() & after.isna())
+    return list(ids), set(same.columns[~same.all()]) <= set(card_fields)
+
+
+def changed_checklists(old, new):
+    """兩份 ChecklistStore 之間 checklist 狀態（項目數 / 完成數 / 缺漏數）有變的專案名稱。"""
+    names = old.status.index.union(new.status.index)
+    before = old.status.reindex(names, fill_value=0)
+    after = new.status.reindex(names, fill_value=0)
+    return list(names[(before != after).any(axis=1)])
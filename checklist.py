@@ -0,0 +1,111 @@
+import json
+
+import pandas as pd
+
+
+# ==============================================
+# Checklist 項目表（一個項目一行）
+# ==============================================
+# 清單類別 -> 已完成清單在 JSON 裡的欄位名
+KINDS = {"purchase": "done_p", "drawing": "done_d"}
+ITEM_COLUMNS = ["Project_Name", "kind", "item", "done", "position"]
+STATUS_COLUMNS = ["checklist_items", "checklist_done", "checklist_missing"]
+
+
+def empty_checklist():
+    return {"purchase": [], "done_p": [], "drawing": [], "done_d": []}
+
+
+def parse_blobs(names, blobs):
+    """一次 json.loads 解析全部 JSON；有壞資料才逐筆解析並略過壞的。"""
+    try:
+        parsed = json.loads("[" + ",".join(blobs) + "]")
+        return list(names), parsed
+    except (TypeError, ValueError):
+        ok_names, ok_parsed = [], []
+        for name, blob in zip(names, blobs):
+            try:
+                ok_parsed.append(json.loads(blob))
+                ok_names.append(name)
+            except:
+                pass
+        return ok_names, ok_parsed
+
+
+def build_items(names, checklists):
+    """把 {project: checklist dict} 一次展開成項目表（一個 pass，最後才建 DataFrame）。"""
+    columns = {c: [] for c in ITEM_COLUMNS}
+    for name, checklist in zip(names, checklists):
+        for kind, done_key in KINDS.items():
+            done = {str(d).strip() for d in checklist.get(done_key) or [] if d is not None}
+            position = 0
+            for item in checklist.get(kind) or []:
+                text = str(item).strip() if item is not None else ""
+                if not text:
+                    continue
+                columns["Project_Name"].append(name)
+                columns["kind"].append(kind)
+                columns["item"].append(text)
+                columns["done"].append(text in done)
+                columns["position"].append(position)
+                position += 1
+    items = pd.DataFrame(columns).astype({"kind": object, "item": object, "done": bool, "position": int})
+    return items.set_index("Project_Name").sort_index(kind="stable")
+
+
+def item_status(items):
+    """每個專案的項目數、已完成數、未完成數。"""
+    if items.empty:
+        return pd.DataFrame(columns=STATUS_COLUMNS, dtype=int, index=pd.Index([], name="Project_Name"))
+    grouped = items["done"].groupby(level=0)
+    status = pd.DataFrame({"checklist_items": grouped.size(), "checklist_done": grouped.sum().astype(int)})
+    status["checklist_missing"] = status["checklist_items"] - status["checklist_done"]
+    return status
+
+
+def checklist_json(checklist):
+    """checklist dict -> 存進 worksheet 的 JSON 文字。"""
+    return json.dumps({**empty_checklist(), **checklist}, ensure_ascii=False)
+
+
+class ChecklistStore:
+    """所有專案的 checklist：項目表 + 以 Project_Name 為 index 的狀態表。
+
+    狀態（項目數 / 未完成數）載入時一次算好；唯讀，存檔後由 snapshot 整份重建。
+    """
+
+    def __init__(self, items, projects=None):
+        self.items = items
+        self.status = item_status(items)
+        # 在 worksheet 有一行 checklist 的專案（包括清單是空的）
+        self.projects = set(projects if projects is not None else self.status.index)
+
+    @classmethod
+    def from_sheet(cls, raw):
+        names, blobs = [], []
+        if not raw.empty and "Project_Name" in raw and "Checklist_Data" in raw:
+            valid = raw[raw["Project_Name"].notna() & raw["Checklist_Data"].notna()]
+            names, blobs = valid["Project_Name"].astype(str).tolist(), valid["Checklist_Data"].astype(str).tolist()
+        names, parsed = parse_blobs(names, blobs)
+        return cls(build_items(names, parsed), names)
+
+    def __contains__(self, project_name):
+        return project_name in self.projects
+
+    def get(self, project_name):
+        """回傳 checklist 面板用的 dict（purchase / done_p / drawing / done_d）。"""
+        result = empty_checklist()
+        if project_name not in self.items.index:
+            return result
+        rows = self.items.loc[[project_name]].sort_values(["kind", "position"])
+        for kind, done_key in KINDS.items():
+            part = rows[rows["kind"] == kind]
+            result[kind] = part["item"].tolist()
+            result[done_key] = part.loc[part["done"], "item"].tolist()
+        return result
+
+    def with_status(self, frame):
+        """把狀態欄位 join 到 projects DataFrame（沒有 checklist 的專案為 0）。"""
+        joined = frame.join(self.status, on="Project_Name")
+        joined[STATUS_COLUMNS] = joined[STATUS_COLUMNS].fillna(0).astype(int)
+        return joined
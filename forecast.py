@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from analytics import MILESTONES, STAGES
+from projects import day_number
+
+
+# ==============================================
+# 延誤預測：用已完成專案的各階段天數，推算進行中專案的交貨日
+# ==============================================
+# 某個 Project_Type 完成的階段少於這個數目，就用所有類型的平均
+MIN_SAMPLES = 5
+RISK_LEVELS = ["Late", "Forecast late", "At risk", "On track", "Delivered", "No forecast"]
+AT_RISK = ["Forecast late", "At risk"]
+
+
+def stage_stats(rollups):
+    """(平均天數, 標準差)：row 是 Project_Type（加上 "All"），column 是 STAGES。
+
+    直接從 rollups 的 schedule 加總算，存檔後 rollup 增量更新，這裡不用重新掃描所有專案。
+    """
+    table = rollups.tables["schedule"].groupby(level="Project_Type").sum()
+    table.loc["All"] = table.sum()
+    mean, std = {}, {}
+    for stage in STAGES:
+        n, days, sq = table[f"{stage}_n"], table[f"{stage}_days"], table[f"{stage}_sq"]
+        enough = n.where(n >= MIN_SAMPLES)
+        enough["All"] = n["All"] if n["All"] > 0 else np.nan
+        m = days / enough
+        v = (sq / enough - m ** 2).clip(lower=0)
+        mean[stage] = m.fillna(m["All"]).fillna(0.0)
+        std[stage] = np.sqrt(v.fillna(v["All"]).fillna(0.0))
+    return pd.DataFrame(mean), pd.DataFrame(std)
+
+
+def forecast(frame, rollups, today):
+    """每個專案的預計交貨日、跟 Lead_Time 相差的天數和風險等級（DataFrame，index 跟 frame 一樣）。
+
+    從最後一個已完成的里程碑起，加上剩下每個階段的平均天數；正在進行的階段最早今天完成。
+    還沒到料的專案由預定的 Parts_Arrival 起算，沒有就不預測。
+    預計交貨日 + 剩下階段的標準差超過 Lead_Time 算 At risk，預計交貨日本身超過算 Forecast late。
+    """
+    t = day_number(today)
+    mean, std = stage_stats(rollups)
+    types = frame["Project_Type"].astype(str).to_numpy()
+    mean = mean.reindex(types).fillna(mean.loc["All"]).to_numpy()
+    var = std.reindex(types).fillna(std.loc["All"]).to_numpy() ** 2
+    rows = np.arange(len(frame))
+
+    days = np.column_stack([frame[c].to_numpy(dtype="float64", na_value=np.nan) for c in MILESTONES])
+    done = days < t
+    delivered = done[:, -1]
+    # 最後一個已完成的里程碑（0 = Parts_Arrival），-1 = 一個都沒完成
+    last = np.where(done.any(axis=1), len(MILESTONES) - 1 - np.argmax(done[:, ::-1], axis=1), -1)
+    anchor = np.where(last >= 0, days[rows, np.maximum(last, 0)], np.maximum(days[:, 0], t))
+    # 第 k 個階段在第 k + 1 個里程碑完成；正在進行的是 first，之後的全部加起來
+    first = np.maximum(last, 0)
+    pad = np.zeros((len(frame), 1))
+    rest = np.hstack([np.cumsum(mean[:, ::-1], axis=1)[:, ::-1], pad])
+    rest_var = np.hstack([np.cumsum(var[:, ::-1], axis=1)[:, ::-1], pad])
+    ongoing = mean[rows, np.minimum(first, len(STAGES) - 1)]
+    projected = np.maximum(anchor + ongoing, t) + rest[rows, np.minimum(first + 1, len(STAGES))]
+    spread = np.sqrt(rest_var[rows, np.minimum(first, len(STAGES))])
+    projected = np.where(delivered, days[:, -1], np.round(projected))
+
+    lead = frame["Lead_Time"].to_numpy(dtype="float64", na_value=np.nan)
+    risk = np.select(
+        [delivered, np.isnan(projected) | np.isnan(lead), lead < t, projected > lead, projected + spread > lead],
+        ["Delivered", "No forecast", "Late", "Forecast late", "At risk"], default="On track")
+    forecast_days = pd.array(np.nan_to_num(projected).astype("int32"), dtype="Int32")
+    forecast_days[np.isnan(projected)] = pd.NA
+    return pd.DataFrame({
+        "forecast": forecast_days,
+        "slack": pd.array(np.where(np.isnan(projected) | np.isnan(lead), np.nan, lead - projected), dtype="Int32"),
+        "risk": pd.Categorical(risk, categories=RISK_LEVELS),
+    }, index=frame.index)
@@ -0,0 +1,146 @@
+import os
+import threading
+
+from storage import StorageBackend
+
+
+# ==============================================
+# 離線快取：最後一次讀取成功的資料存在本機（Arrow 檔），開機直接用、連不上也能看
+# ==============================================
+TABLES = ["projects", "checklist"]
+
+
+def write_frame(frame, path):
+    """原始 DataFrame -> Arrow IPC 檔（先寫暫存檔再換名，寫到一半當機也不會壞）。"""
+    import pyarrow as pa
+    # 讀回來的儲存格有數字也有文字：一律存成文字，跟 SQLite 後端讀回來的一樣
+    table = pa.Table.from_pandas(frame.astype("string"), preserve_index=False)
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_frame(path):
+    """Arrow IPC 檔 -> DataFrame（memory map：不用先把整個檔案讀進記憶體）。"""
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+class OfflineCacheBackend(StorageBackend):
+    """包住另一個後端（Google Sheets）：讀取成功的資料存一份在 cache_dir。
+
+    開機時有本機檔案就直接用，同時在背景向後端重新讀取（revalidate），讀到新資料 versions() 就會變；
+    之後照常經後端讀取，連不上（任何例外）就繼續用最後一份，offline 設為 True。
+    寫入直接交給後端；離線時的改動由外面的 WriteBehindBackend 排隊，連得上再寫。
+    """
+
+    def __init__(self, backend, cache_dir):
+        self.backend = backend
+        self.label = backend.label
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.offline = False
+        self.last_error = None
+        self._frames = {}
+        self._seen = {}  # table -> 後端的版本號（有變才重寫本機檔案）
+        self._versions = {t: 0 for t in TABLES}
+        self._revalidating = {}
+        self._lock = threading.Lock()
+
+    def _path(self, table):
+        return os.path.join(self.cache_dir, f"{table}.arrow")
+
+    def saved_at(self, table="projects"):
+        """本機那份資料最後一次從後端讀到的時間（epoch 秒），沒有就是 None。"""
+        path = self._path(table)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def _accept(self, table, frame):
+        version = self.backend.versions().get(table)
+        with self._lock:
+            self.offline = False
+            self.last_error = None
+            if table in self._frames and self._seen.get(table) == version:
+                return
+            self._seen[table] = version
+            self._frames[table] = frame
+            self._versions[table] += 1
+        try:
+            write_frame(frame, self._path(table))
+        except Exception as exc:
+            # 存不了本機檔案只是下次開機慢一點
+            self.last_error = f"{type(exc).__name__}: {exc}"
+
+    def _fetch(self, table):
+        frame = self.backend.read_projects() if table == "projects" else self.backend.read_checklist()
+        self._accept(table, frame)
+        return frame
+
+    def _failed(self, exc):
+        with self._lock:
+            self.offline = True
+            self.last_error = f"{type(exc).__name__}: {exc}"
+
+    def _revalidate(self, table):
+        try:
+            self._fetch(table)
+        except Exception as exc:
+            self._failed(exc)
+        finally:
+            self._revalidating.pop(table, None)
+
+    def _read(self, table):
+        if table not in self._seen:
+            if table not in self._frames and os.path.exists(self._path(table)):
+                # 開機：先用本機那份，背景再問後端
+                try:
+                    self._frames[table] = read_frame(self._path(table))
+                except Exception:
+                    pass
+            if table in self._frames:
+                with self._lock:
+                    if table not in self._revalidating:
+                        thread = threading.Thread(target=self._revalidate, args=(table,), daemon=True,
+                                                  name=f"revalidate-{table}")
+                        self._revalidating[table] = thread
+                        thread.start()
+                return self._frames[table]
+            # 沒有本機檔案：只能等後端
+            return self._fetch(table)
+        try:
+            return self._fetch(table)
+        except Exception as exc:
+            self._failed(exc)
+            if table not in self._frames:
+                raise
+            return self._frames[table]
+
+    def read_projects(self):
+        return self._read("projects")
+
+    def read_checklist(self):
+        return self._read("checklist")
+
+    def save_projects(self, changes):
+        self.backend.save_projects(changes)
+
+    def save_checklist(self, changes):
+        self.backend.save_checklist(changes)
+
+    def read_audit(self, project_id=None, since=None):
+        return self.backend.read_audit(project_id, since)
+
+    def refresh(self, *tables):
+        self.backend.refresh(*tables)
+
+    def change_token(self):
+        token = self.backend.change_token()
+        if token is None:
+            return None
+        # 背景 revalidate 讀到新資料：各個畫面也要更新
+        return {**token, **{t: f"{token.get(t)}@{v}" for t, v in self._versions.items()}}
+
+    def versions(self):
+        return dict(self._versions)
@@ -0,0 +1,414 @@
+import hashlib
+import threading
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+
+
+# ==============================================
+# 差異寫入：只寫有改動的 row / cell
+# ==============================================
+def to_cell(value):
+    """把 DataFrame 的值轉成寫入 Google Sheets 的格式。"""
+    if value is None:
+        return ""
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.strftime("%Y-%m-%d") if pd.notna(value) else ""
+    if isinstance(value, (list, dict)):
+        return value
+    if pd.isna(value):
+        return ""
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def rowcol_to_a1(row, col):
+    """(1, 1) -> "A1"，跟 gspread.utils.rowcol_to_a1 一樣。"""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return f"{letters}{row}"
+
+
+def diff_fields(old, new, columns):
+    """比較新舊兩筆記錄，回傳值有變的欄位。"""
+    return [c for c in columns if to_cell(old.get(c)) != to_cell(new.get(c))]
+
+
+# ==============================================
+# 專案 ID / 版本號（多人同時編輯的衝突偵測）
+# ==============================================
+def _text_id(hex_id):
+    """Google Sheets（USER_ENTERED）會把像數字的文字（全是數字、12e34）存成數字，前面的 0 也會不見：
+    這種 ID 第一個字換成字母，讀回來才對得上。"""
+    try:
+        float(hex_id)
+    except ValueError:
+        return hex_id
+    return "p" + hex_id[1:]
+
+
+def new_project_id():
+    return _text_id(uuid.uuid4().hex[:12])
+
+
+def name_project_id(name):
+    """舊資料沒有 Project_ID：由 Project_Name 算出固定的 ID，每個 session 算出來都一樣。"""
+    return _text_id(hashlib.sha1(str(name).encode("utf-8")).hexdigest()[:12])
+
+
+def fill_project_ids(frame):
+    """補上空白的 Project_ID（第一次寫入該 row 時才會真正存回去）。"""
+    if "Project_Name" not in frame.columns:
+        return frame
+    ids = frame["Project_ID"] if "Project_ID" in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+    missing = (ids.isna() | (ids.astype(str).str.strip() == "")) & frame["Project_Name"].notna()
+    if not missing.any():
+        return frame
+    frame = frame.copy()
+    frame["Project_ID"] = ids.astype(object).where(~missing, frame["Project_Name"].map(name_project_id))
+    return frame
+
+
+def as_revision(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def same_value(a, b):
+    """比較兩個儲存格的值（Google Sheets 讀回來的數字 / 日期格式可能不一樣）。"""
+    a, b = str(to_cell(a)).strip(), str(to_cell(b)).strip()
+    if a == b:
+        return True
+    try:
+        return float(a) == float(b)
+    except ValueError:
+        pass
+    da, db = pd.to_datetime(a, errors="coerce"), pd.to_datetime(b, errors="coerce")
+    return pd.notna(da) and pd.notna(db) and da == db
+
+
+def merge_fields(fields, base, mine, theirs):
+    """三方合併：base 是編輯前的值，theirs 是目前存著的值。
+
+    別人沒動過的欄位照寫；別人改成跟我一樣的不用寫；兩邊都改了而且不一樣就是衝突。
+    回傳 (要寫的欄位, 衝突的欄位)。
+    """
+    apply, conflicts = [], []
+    for f in fields:
+        if same_value(theirs.get(f), base.get(f)):
+            apply.append(f)
+        elif not same_value(theirs.get(f), mine.get(f)):
+            conflicts.append(f)
+    return apply, conflicts
+
+
+class ConflictError(Exception):
+    """別人先改了（或刪除了）同一個專案。沒衝突的部分已經寫入。
+
+    conflicts：[{"key", "name", "field", "mine", "theirs"}]，field 是 None 代表專案已被刪除
+    （或刪除時別人剛改過它）。
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        names = ", ".join(sorted({str(c["name"]) for c in conflicts}))
+        super().__init__(f"Edit conflict: {names} was changed by someone else")
+
+
+def conflict(key, record, field=None, theirs=None):
+    return {"key": key, "name": record.get("Project_Name", key), "field": field,
+            "mine": None if field is None else to_cell(record.get(field)), "theirs": to_cell(theirs)}
+
+
+def name_conflict(key, record, key_field="Project_Name"):
+    """新增 / 改名用到別的專案已經在用的名字：不寫入。"""
+    name = to_cell(record.get(key_field))
+    return {"key": key, "name": name, "field": key_field, "mine": name, "theirs": name, "duplicate": True}
+
+
+class ChangeSet:
+    """一次存檔要寫入的改動，以 key（Project_Name）分組。
+
+    同一個 key 的多次改動會合併：add 後再 update 仍然是 add，
+    add 後再 delete 就兩個都不寫。
+
+    base[key] 是編輯前的值（含版本號），存檔時用來檢查別人有沒有先改過；
+    合併多次改動時保留最早那一次的 base。
+    stamps[key] 是 (時間, 使用者)，改動記錄用（stamp() 填上，背景寫入時不會變成寫入的時間）。
+    checklist[key] 是跟著這個專案的 checklist 改動（改名搬 checklist / 刪除專案刪 checklist），
+    專案寫入成功才寫（StorageBackend.commit_projects）。
+    """
+
+    def __init__(self, key_field="Project_Name"):
+        self.key_field = key_field
+        self.added = {}
+        self.updated = {}
+        self.deleted = set()
+        self.base = {}
+        self.stamps = {}
+        self.checklist = {}
+
+    def _set_base(self, key, base):
+        if base is not None:
+            self.base[key] = {**base, **self.base.get(key, {})}
+
+    def _resolve(self, key):
+        # 改過名的專案：新名字對應回原本的 key
+        if key in self.added or key in self.updated:
+            return key
+        for pending in (self.added, self.updated):
+            for old_key, record in pending.items():
+                record = record[0] if isinstance(record, tuple) else record
+                if record.get(self.key_field) == key:
+                    return old_key
+        return key
+
+    def add(self, key, record):
+        self.deleted.discard(key)
+        self.base.pop(key, None)
+        self.added[key] = dict(record)
+
+    def update(self, key, record, fields=None, base=None):
+        key = self._resolve(key)
+        if key in self.added:
+            self.added[key].update(record)
+            return
+        self._set_base(key, base)
+        if key in self.updated:
+            prev_record, prev_fields = self.updated[key]
+            prev_record.update(record)
+            fields = None if fields is None or prev_fields is None else sorted(set(prev_fields) | set(fields))
+            record = prev_record
+        self.updated[key] = (dict(record), fields)
+
+    def delete(self, key, base=None):
+        key = self._resolve(key)
+        if self.added.pop(key, None) is not None:
+            self.base.pop(key, None)
+            return
+        self.updated.pop(key, None)
+        self.deleted.add(key)
+        self._set_base(key, base)
+
+    def stamp(self, user, when=None):
+        """還沒有時間 / 使用者的改動填上（when 預設現在）。"""
+        when = when or datetime.now().isoformat(timespec="milliseconds")
+        for key in (*self.added, *self.updated, *self.deleted):
+            self.stamps.setdefault(key, (when, user))
+
+    def merge(self, other):
+        for key in other.deleted:
+            self.delete(key, other.base.get(key))
+        for key, record in other.added.items():
+            self.add(key, record)
+        for key, (record, fields) in other.updated.items():
+            self.update(key, record, fields, other.base.get(key))
+        for key, stamp in other.stamps.items():
+            # 合併後用最後一次改動的時間 / 使用者
+            self.stamps[self._resolve(key)] = stamp
+        for key, changes in other.checklist.items():
+            self.checklist.setdefault(key, ChangeSet()).merge(changes)
+
+    def to_json(self):
+        """-> 可以 json.dumps 的 dict（值用 to_cell 轉成寫入的格式），離線佇列存檔用。"""
+        def cells(record):
+            return {f: to_cell(v) for f, v in record.items()}
+        return {"key_field": self.key_field,
+                "added": {k: cells(r) for k, r in self.added.items()},
+                "updated": {k: [cells(r), fields] for k, (r, fields) in self.updated.items()},
+                "deleted": sorted(self.deleted),
+                "base": {k: cells(r) for k, r in self.base.items()},
+                "stamps": {k: list(s) for k, s in self.stamps.items()},
+                "checklist": {k: c.to_json() for k, c in self.checklist.items()}}
+
+    @classmethod
+    def from_json(cls, data):
+        changes = cls(data.get("key_field", "Project_Name"))
+        changes.added = {k: dict(r) for k, r in data.get("added", {}).items()}
+        changes.updated = {k: (dict(r), fields) for k, (r, fields) in data.get("updated", {}).items()}
+        changes.deleted = set(data.get("deleted", []))
+        changes.base = {k: dict(r) for k, r in data.get("base", {}).items()}
+        changes.stamps = {k: tuple(s) for k, s in data.get("stamps", {}).items()}
+        changes.checklist = {k: cls.from_json(c) for k, c in data.get("checklist", {}).items()}
+        return changes
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.deleted)
+
+    def __len__(self):
+        return len(self.added) + len(self.updated) + len(self.deleted)
+
+
+class SheetTable:
+    """一個 worksheet 的 row-level 寫入，以 key 欄位（預設 Project_Name）定位 row。
+
+    每次 commit：讀一次 key 欄位（有版本號的話連同 revision 欄位，同一個 API call）找 row 號碼，
+    update 用一個 batch_update，add 用一個 append_rows，delete 由下而上逐行刪除。
+
+    有 revision 欄位時做 compare-and-swap：版本號跟 base 不一樣的 row 才讀回那一行做欄位合併，
+    有衝突的欄位不寫，最後丟 ConflictError。Google Sheets 沒有交易，同一個 process 內用 lock
+    保證先檢查後寫入；不同 process 之間仍有讀版本號到寫入之間的短暫空檔。
+    legacy=(欄位, 函數)：key 欄位是空白的舊 row，用該欄位算出 key，寫入時順便補上。
+    unique：值不可以重複的欄位（projects 的 Project_Name）：新增 / 改名撞到別的 key 的值不寫，
+    回報 name_conflict（跟 SQLite 的 unique index 一樣）。
+    """
+
+    def __init__(self, conn, worksheet, columns, key="Project_Name", revision=None, legacy=None, unique=None):
+        self._conn = conn
+        self.worksheet = worksheet
+        self.columns = list(columns)
+        self.key = key
+        self.revision = revision
+        self.legacy = legacy
+        self.unique = unique
+        self._ws = None
+        self._header = None
+        self._lock = threading.Lock()
+
+    def _worksheet(self):
+        if self._ws is None:
+            # GSheetsConnection 沒有公開 gspread Worksheet，只能用 client 的內部方法
+            self._ws = self._conn.client._select_worksheet(worksheet=self.worksheet)
+        return self._ws
+
+    def _header_row(self, ws):
+        if self._header is None:
+            header = [h for h in ws.row_values(1) if h]
+            if not header:
+                header = list(self.columns)
+                ws.update(range_name="A1", values=[header])
+            for c in self.columns:
+                if c not in header:
+                    header.append(c)
+                    ws.update(range_name=rowcol_to_a1(1, len(header)), values=[[c]])
+            self._header = header
+        return self._header
+
+    def _row_values(self, header, record):
+        return [to_cell(record.get(c)) for c in header]
+
+    def _read_columns(self, ws, header, names):
+        """一個 API call 讀回幾個整欄（不含標題），長度補齊到一樣。"""
+        if len(names) == 1:
+            columns = [ws.col_values(header.index(names[0]) + 1)[1:]]
+        else:
+            ranges = []
+            for name in names:
+                letters = rowcol_to_a1(1, header.index(name) + 1)[:-1]
+                ranges.append(f"{letters}2:{letters}")
+            columns = [list(v[0]) if v else [] for v in ws.batch_get(ranges, major_dimension="COLUMNS")]
+        n = max(map(len, columns))
+        return [c + [""] * (n - len(c)) for c in columns]
+
+    def commit(self, changes):
+        if not changes:
+            return
+        with self._lock:
+            ws = self._worksheet()
+            header = self._header_row(ws)
+            names = [self.key] + [c for c in (self.revision, self.legacy and self.legacy[0], self.unique) if c]
+            names = list(dict.fromkeys(names))
+            columns = dict(zip(names, self._read_columns(ws, header, names)))
+            row_of, revision_of, unkeyed = {}, {}, set()
+            owner = {}  # unique 欄位的值 -> 用它的 key
+            for i, k in enumerate(columns[self.key]):
+                if not k and self.legacy and columns[self.legacy[0]][i]:
+                    k = self.legacy[1](columns[self.legacy[0]][i])
+                    unkeyed.add(k)
+                if k and k not in row_of:
+                    row_of[k] = i + 2
+                    if self.revision:
+                        revision_of[k] = as_revision(columns[self.revision][i])
+                if k and self.unique and str(columns[self.unique][i]).strip():
+                    owner.setdefault(str(columns[self.unique][i]).strip(), k)
+
+            def passes(key):
+                # 這次要刪除而且版本號對得上：名字可以讓給別的專案用
+                base = changes.base.get(key) if self.revision else None
+                return base is None or revision_of.get(key) == as_revision(base.get(self.revision))
+
+            freed = {k for k in changes.deleted if k in row_of and passes(k)}
+            owner = {v: k for v, k in owner.items() if k not in freed}
+
+            def taken(key, record):
+                value = str(to_cell(record.get(self.unique))).strip()
+                if not value:
+                    return False
+                if owner.get(value, key) != key:
+                    return True
+                for v in [v for v, k in owner.items() if k == key]:
+                    del owner[v]
+                owner[value] = key
+                return False
+
+            conflicts = []
+            appends = []
+            for key, record in changes.added.items():
+                if self.unique and taken(key, record):
+                    conflicts.append(name_conflict(key, record, self.unique))
+                    continue
+                record = {**record, self.key: key}
+                if self.revision:
+                    record[self.revision] = 1
+                appends.append(self._row_values(header, record))
+
+            updates = []
+            for key, (record, fields) in changes.updated.items():
+                if self.unique and (fields is None or self.unique in fields) and self.unique in record \
+                        and taken(key, record):
+                    # 改名改成別的專案的名字：整筆不寫
+                    conflicts.append(name_conflict(key, record, self.unique))
+                    continue
+                r = row_of.get(key)
+                base = changes.base.get(key) if self.revision else None
+                if r is None:
+                    if base is not None:
+                        conflicts.append(conflict(key, record))
+                    else:
+                        appends.append(self._row_values(header, record))
+                    continue
+                merged = False
+                if base is not None:
+                    if revision_of[key] != as_revision(base.get(self.revision)):
+                        merged = True
+                        theirs = dict(zip(header, ws.row_values(r)))
+                        check = fields if fields is not None else [c for c in base if c != self.revision]
+                        fields, clash = merge_fields(check, base, record, theirs)
+                        conflicts.extend(conflict(key, record, f, theirs.get(f)) for f in clash)
+                        if not fields:
+                            continue
+                    record = {**record, self.key: key, self.revision: revision_of[key] + 1}
+                    if fields is not None:
+                        fields = list(fields) + [self.revision] + ([self.key] if key in unkeyed else [])
+                # 合併過的 row 只寫合併後的欄位：整行寫會用舊的 record 蓋掉別人剛改的值
+                if not merged and (fields is None or len(fields) * 2 > len(header)):
+                    updates.append({"range": f"{rowcol_to_a1(r, 1)}:{rowcol_to_a1(r, len(header))}",
+                                    "values": [self._row_values(header, record)]})
+                else:
+                    for f in fields:
+                        updates.append({"range": rowcol_to_a1(r, header.index(f) + 1),
+                                        "values": [[to_cell(record.get(f))]]})
+
+            deletes = []
+            for key in changes.deleted:
+                if key not in row_of:
+                    continue
+                if key not in freed:
+                    conflicts.append(conflict(key, changes.base.get(key)))
+                    continue
+                deletes.append(row_of[key])
+
+            if updates:
+                ws.batch_update(updates, value_input_option="USER_ENTERED")
+            for r in sorted(deletes, reverse=True):
+                ws.delete_rows(r)
+            if appends:
+                ws.append_rows(appends, value_input_option="USER_ENTERED", table_range="A1")
+        if conflicts:
+            raise ConflictError(conflicts)
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# ==============================================
+# 效能計時（load / parse / filter / render / save）
+# ==============================================
+class Profiler:
+    """一次 rerun 的計時；同名 span 會累加。"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = {}
+
+    @contextmanager
+    def span(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - t) * 1000)
+
+    def add(self, name, ms):
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def record(self, view, **extra):
+        return {"ts": self.started, "view": view,
+                "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+                "spans": {k: round(v, 3) for k, v in self.spans.items()}, **extra}
+
+
+class ProfileLog:
+    """整個 process 共用的計時記錄（最近 maxlen 筆），可選擇同時寫入 JSON lines 檔案。"""
+
+    def __init__(self, maxlen=2000, path=None):
+        self.records = deque(maxlen=maxlen)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def timing(self, view, span, ms, **extra):
+        self.add({"ts": time.time(), "view": view, "total_ms": round(ms, 3), "spans": {span: round(ms, 3)}, **extra})
+
+    def to_jsonl(self):
+        with self._lock:
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.records)
+
+    def frame(self):
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return pd.DataFrame(columns=["view", "total_ms"])
+        spans = pd.DataFrame([r["spans"] for r in records])
+        base = pd.DataFrame({"view": [r["view"] for r in records], "total_ms": [r["total_ms"] for r in records]})
+        return pd.concat([base, spans], axis=1)
+
+    def summary(self):
+        """每個 view 每個 span 的 p50 / p95（毫秒）。"""
+        frame = self.frame()
+        if frame.empty:
+            return frame
+        stats = frame.groupby("view").quantile([0.5, 0.95])
+        stats.index = stats.index.set_levels(["p50", "p95"], level=1)
+        stats = stats.round(1)
+        stats.insert(0, "runs", stats.index.get_level_values(0).map(frame["view"].value_counts()))
+        return stats
@@ -0,0 +1,49 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from projects import day_number
+
+
+# ==============================================
+# 進度計算 + 顏色（整個 DataFrame 一次計算）
+# ==============================================
+# 每個里程碑日期已過（早於今天）就加上對應的百分比
+MILESTONE_WEIGHTS = pd.Series({
+    "Parts_Arrival": 30,
+    "Installation_Complete": 40,
+    "Testing_Complete": 10,
+    "Cleaning_Complete": 10,
+    "Delivery_Complete": 10,
+})
+
+# 由高至低：進度 >= 門檻就用該顏色
+PROGRESS_COLORS = pd.Series({100: "#0066ff", 90: "#00aa00", 70: "#66cc66", 30: "#ffaa00", 0: "#ff4444"})
+
+
+def milestone_done(frame, today=None):
+    """每個里程碑是否已完成（bool 陣列，shape = rows x 5）。日期欄位是 Int32 日數。"""
+    today = day_number(today or date.today())
+    return np.column_stack([frame[c].lt(today).fillna(False).to_numpy(dtype=bool)
+                            for c in MILESTONE_WEIGHTS.index])
+
+
+def progress_values(frame, today=None):
+    if frame.empty:
+        return np.zeros(0, dtype=int)
+    done = milestone_done(frame, today)
+    return np.minimum(done @ MILESTONE_WEIGHTS.to_numpy(), 100).astype(int)
+
+
+def progress_colors(pct):
+    pct = np.asarray(pct)
+    return np.select([pct >= t for t in PROGRESS_COLORS.index], PROGRESS_COLORS.to_list(),
+                     default=PROGRESS_COLORS.iloc[-1])
+
+
+def with_progress(frame, today=None):
+    """回傳加上 progress / color 兩欄的新 DataFrame。"""
+    pct = progress_values(frame, today)
+    colors = pd.Categorical(progress_colors(pct), categories=PROGRESS_COLORS.unique())
+    return frame.assign(progress=pct, color=colors)
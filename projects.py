@@ -0,0 +1,145 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from storage import PROJECT_COLUMNS
+
+
+# ==============================================
+# projects 原始資料 -> 有型別的 DataFrame
+# ==============================================
+DATE_COLUMNS = ["Lead_Time","Parts_Arrival","Installation_Complete","Testing_Complete","Cleaning_Complete","Delivery_Complete"]
+# 重複值很多的文字欄位用 category
+CATEGORY_COLUMNS = ["Project_Type", "Customer", "Supervisor", "Progress_Reminder"]
+# Project_Spec 每一行的標籤 -> 拆出來的欄位
+SPEC_FIELDS = {"Genset model": "Genset_Model", "Alternator Model": "Alternator_Model", "Controller": "Controller",
+               "Circuit breaker Size": "Breaker_Size", "Charger": "Charger"}
+
+EPOCH = pd.Timestamp("1970-01-01")
+
+
+# ---------- 日期：記憶體內存成 Int32 日數（1970-01-01 起），缺少是 <NA> ----------
+def to_days(values):
+    """日期字串 / datetime -> Int32 日數。"""
+    dates = pd.to_datetime(pd.Series(values), errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype("int64").astype("int32")
+    return pd.Series(pd.arrays.IntegerArray(days, dates.isna().to_numpy()), index=dates.index)
+
+
+def day_number(value):
+    """一個日期 -> 日數（給跟 Int32 日期欄位比較用）。"""
+    return (pd.Timestamp(value).normalize() - EPOCH).days
+
+
+def days_to_dates(days):
+    """Int32 日數欄位 -> datetime64 Series。"""
+    return EPOCH + pd.to_timedelta(days.astype("float64"), unit="D")
+
+
+def day_to_timestamp(day):
+    return pd.NaT if pd.isna(day) else EPOCH + pd.Timedelta(days=int(day))
+
+
+# ---------- Project_Spec ----------
+def format_spec(values):
+    """五個規格值 -> Project_Spec 文字（空的顯示 —）。"""
+    return "\n".join(f"{label}: {value or '—'}" for label, value in zip(SPEC_FIELDS, values))
+
+
+def spec_values(text):
+    """一份 Project_Spec 文字 -> 五個值（依行數對應，跟編輯表單一樣）。"""
+    lines = [line.split(": ", 1)[1] if ": " in line else "" for line in text.split("\n")] if text else []
+    return (lines + [""] * len(SPEC_FIELDS))[:len(SPEC_FIELDS)]
+
+
+def split_spec(spec):
+    """Project_Spec Series -> SPEC_FIELDS 五個 category 欄位。
+
+    同一份規格常常重複出現：每種文字只拆一次，再用 category 的代碼展開。
+    """
+    if not isinstance(spec.dtype, pd.CategoricalDtype):
+        spec = spec.fillna("").astype(str).astype("category")
+    codes, uniques = spec.cat.codes.to_numpy(), spec.cat.categories
+    parsed = [spec_values(text) for text in uniques]
+    out = {}
+    for i, column in enumerate(SPEC_FIELDS.values()):
+        value_codes, categories = pd.factorize(pd.Index([p[i] for p in parsed], dtype=object))
+        out[column] = pd.Categorical.from_codes(value_codes[codes], categories=categories)
+    return pd.DataFrame(out, index=spec.index)
+
+
+def project_record(row):
+    """卡片 / 篩選用的 row（dict）-> 存檔格式的記錄：日期換回 Timestamp，給表單和差異比較用。"""
+    record = dict(row)
+    for c in DATE_COLUMNS:
+        record[c] = day_to_timestamp(record.get(c))
+    return record
+
+
+def parse_projects(raw, today=None):
+    """把後端讀回來的原始 projects（日期是字串）轉成 app 用的 DataFrame。
+
+    日期欄位是 Int32 日數、重複多的文字（含 Project_Spec）是 category，
+    Project_Spec 另外拆成 SPEC_FIELDS 五欄，卡片和編輯表單不用每次重新拆。
+    """
+    today = today or date.today()
+    df = raw.dropna(how="all")
+    if df.empty:
+        df = pd.DataFrame(columns=PROJECT_COLUMNS)
+    else:
+        df = df.copy()
+
+    for c in PROJECT_COLUMNS:
+        if c not in df.columns:
+            df[c] = "" if c != "Year" else 2025
+    df = df[PROJECT_COLUMNS]
+
+    for c in DATE_COLUMNS:
+        df[c] = to_days(df[c])
+    for c in CATEGORY_COLUMNS:
+        df[c] = df[c].fillna("").astype(str).str.strip().astype("category")
+
+    df["Year"] = pd.to_numeric(df["Year"], errors="coerce").fillna(today.year).astype("int16")
+    df["Qty"] = pd.to_numeric(df["Qty"], errors="coerce").fillna(1).astype("int32")
+    df["Real_Count"] = pd.to_numeric(df["Real_Count"], errors="coerce").fillna(df["Qty"]).astype("int32")
+    df["Revision"] = pd.to_numeric(df["Revision"], errors="coerce").fillna(0).astype("int32")
+    df["Project_ID"] = df["Project_ID"].astype(str)
+    # 同樣的規格很常重複，整段文字也用 category
+    df["Project_Spec"] = df["Project_Spec"].fillna("").astype(str).astype("category")
+    return pd.concat([df, split_spec(df["Project_Spec"])], axis=1)
+
+
+# ==============================================
+# 新舊兩份資料的差異（analytics.Rollups / search.SearchIndex 增量更新用）
+# ==============================================
+# 改動超過這個比例就整份重建（實測 300 / 3,000 / 30,000 行：搜尋索引大約 5% 改動時兩者一樣快，統計大約 10%）
+REBUILD_RATIO = 0.05
+
+
+def project_identity(frame, columns):
+    """(Project_ID index, 每個專案 columns 的 hash)，用來對應新舊兩份資料。"""
+    # object index：查找比 pandas 的 str index 快很多；同一個 index 下次比較直接重用
+    ids = pd.Index(frame["Project_ID"].to_numpy(dtype=object), dtype=object)
+    return ids, pd.util.hash_pandas_object(frame[columns], index=False).to_numpy()
+
+
+def changed_rows(old, new):
+    """比較兩個 project_identity，回傳 (pos, same, added, removed)：
+
+    pos[i] 是新資料第 i 行在舊資料的位置（-1 = 新增），same 是 hash 沒變的新資料行，
+    added 是新增 / 有改動的新資料行位置，removed 是刪除 / 有改動的舊資料行位置。
+    Project_ID 重複（對應不到）或改動超過 REBUILD_RATIO 回傳 None：整份重建。
+    """
+    (old_ids, old_hashes), (ids, hashes) = old, new
+    if not old_ids.is_unique or not ids.is_unique:
+        return None
+    pos = old_ids.get_indexer(ids)
+    same = pos >= 0
+    same[same] = old_hashes[pos[same]] == hashes[same]
+    kept = np.zeros(len(old_ids), dtype=bool)
+    kept[pos[same]] = True
+    added, removed = np.flatnonzero(~same), np.flatnonzero(~kept)
+    if len(added) + len(removed) > len(ids) * REBUILD_RATIO:
+        return None
+    return pos, same, added, removed
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from projects import day_number, days_to_dates
+
+
+# ==============================================
+# 篩選查詢（預先建好的 index，不用每次複製 DataFrame）
+# ==============================================
+def _groups(values):
+    """值 -> 該值所在的 row 位置（已排序的 numpy 陣列）；NaN 不列入。"""
+    return {k: np.asarray(v) for k, v in values.groupby(values, sort=False, observed=True).indices.items()}
+
+
+def _text(frame, column):
+    values = frame[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # parse_projects 已經清理過（沒有 NaN、去掉空白）
+        return values
+    return values.fillna("").astype(str).str.strip()
+
+
+class ProjectQuery:
+    """一份 projects DataFrame 的篩選 index。
+
+    select() / overdue() / at_risk() 回傳 row 位置（np.ndarray，依原本次序），
+    呼叫端再用 frame.iloc[positions] 取出需要的 row。search 是同一份資料的 search.SearchIndex
+    （沒有的話文字搜尋只逐行比對 Project_Spec）。
+    """
+
+    def __init__(self, frame, search=None):
+        self.search = search
+        self.size = len(frame)
+        self.by_year = _groups(frame["Year"])
+        self.by_type = _groups(_text(frame, "Project_Type"))
+        self.by_month = _groups(days_to_dates(frame["Lead_Time"]).dt.month.astype("Int64"))
+        self.by_customer = _groups(_text(frame, "Customer"))
+        self.by_supervisor = _groups(_text(frame, "Supervisor"))
+
+        # Lead_Time（日數）排序後的位置，用 searchsorted 找出已過期的專案
+        lead = frame["Lead_Time"].to_numpy(dtype="float64", na_value=np.nan)
+        valid = np.flatnonzero(~np.isnan(lead))
+        self._lead_order = valid[np.argsort(lead[valid], kind="stable")]
+        self._lead_sorted = lead[self._lead_order]
+        self._progress = frame["progress"].to_numpy() if "progress" in frame else np.zeros(self.size)
+        self._spec = _text(frame, "Project_Spec").str.lower().to_numpy()
+        self._risk = frame["risk"] if "risk" in frame else None
+
+    def options(self, group):
+        """給 selectbox 用的選項（排序過，不含空字串）。"""
+        return sorted(k for k in getattr(self, f"by_{group}") if k != "")
+
+    def overdue(self, today, incomplete_only=True):
+        """Lead_Time 早於 today（且進度未到 100%）的專案位置。"""
+        cut = np.searchsorted(self._lead_sorted, day_number(today), side="left")
+        positions = np.sort(self._lead_order[:cut])
+        if incomplete_only:
+            positions = positions[self._progress[positions] < 100]
+        return positions
+
+    def at_risk(self, levels):
+        """預測風險等級（forecast.RISK_LEVELS）是 levels 其中一個的專案位置。"""
+        if self._risk is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self._risk.isin(levels).to_numpy())
+
+    def select(self, year=None, project_type=None, month=None, customer=None, supervisor=None, text=None,
+               missing_only=False):
+        """所有條件 AND；None 代表不篩選這一項。missing_only：text 只找未完成的 checklist 項目。"""
+        positions = None
+        for groups, key in ((self.by_year, year), (self.by_type, project_type), (self.by_month, month),
+                            (self.by_customer, customer), (self.by_supervisor, supervisor)):
+            if key is None:
+                continue
+            found = groups.get(key, np.empty(0, dtype=np.intp))
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if text and self.search is not None:
+            found = self.search.find(text, missing_only)
+            if found is not None:
+                positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+            text = None
+        if positions is None:
+            positions = np.arange(self.size)
+        if text:
+            needle = text.strip().lower()
+            positions = np.asarray([p for p in positions if needle in self._spec[p]], dtype=np.intp)
+        return positions
@@ -0,0 +1,235 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from projects import SPEC_FIELDS, changed_rows, project_identity
+
+
+# ==============================================
+# 全文搜尋：規格 / 描述 / 客戶 / checklist 項目的倒排索引（存檔後只更新有改動的專案）
+# ==============================================
+TEXT_COLUMNS = ["Project_Spec", "Description", "Progress_Reminder", "Customer"]
+# 未完成的 checklist 項目另外再索引一次（詞前面加 MISSING），用來找「還欠某張圖」的專案
+MISSING = "!"
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-/][a-z0-9]+)*|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_PARTS = re.compile(r"[a-z]+|[0-9]+")
+_SEPARATORS = re.compile(r"[-/]")
+_LABELS = re.compile(r"^\s*(?:" + "|".join(re.escape(label) for label in SPEC_FIELDS) + r")\s*:", re.I | re.M)
+
+
+def _words(text):
+    # NFKC：全形英數字 -> 半形
+    return _WORD.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _joined(word):
+    # DSE-7320 / IL-NT：中間的 - / 不算分隔，跟 DSE7320 一樣
+    return word.replace("-", "").replace("/", "")
+
+
+def tokens(text):
+    """一段文字 -> 索引用的詞（set）。
+
+    英數字：整段（dse-7320 -> dse7320）、每一段，再加上字母 / 數字分開的部分（dse、7320）；
+    中文：單字加上相鄰兩字（bigram），不用斷詞也找得到任何兩個字以上的詞。
+    """
+    out = set()
+    for word in _words(text):
+        if word.isascii():
+            out.add(_joined(word))
+            out.update(_PARTS.findall(word))
+            out.update(_SEPARATORS.split(word))
+        else:
+            out.update(word)
+            out.update(word[i:i + 2] for i in range(len(word) - 1))
+    return out
+
+
+def query_terms(text):
+    """搜尋字串 -> [(詞, 是否前綴比對)]：英數字用前綴（打到一半也找得到），中文用 bigram（一個字就用單字）。"""
+    terms = []
+    for word in _words(text):
+        if word.isascii():
+            terms.append((_joined(word), True))
+        elif len(word) == 1:
+            terms.append((word, False))
+        else:
+            terms.extend((word[i:i + 2], False) for i in range(len(word) - 1))
+    return terms
+
+
+class _Terms:
+    """建索引時的詞 -> 整數 id（排序 / 去重都用整數做）。"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def id_of(self, term):
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.names)
+            self.names.append(term)
+        return i
+
+
+def _pairs(terms, values, docs, prefix="", clean=None):
+    """每個 doc 的一段文字 -> (詞 id, doc) 兩個陣列；相同的文字只斷詞一次。"""
+    # category 也用 factorize：只斷詞實際有用到的值（增量更新時只有幾行）
+    codes, uniques = pd.factorize(values)
+    texts = ["" if pd.isna(u) else str(u) for u in uniques] + [""]  # code -1（NaN）-> 最後一個
+    if clean is not None:
+        texts = [clean(t) for t in texts]
+    words = [[terms.id_of(prefix + w) for w in tokens(t)] for t in texts]
+    counts = np.fromiter((len(w) for w in words), dtype=np.intp, count=len(words))
+    flat = np.fromiter((w for ws in words for w in ws), dtype=np.int64, count=int(counts.sum()))
+    starts = np.cumsum(counts) - counts
+    per_row = counts[codes]
+    # 每一行展開成它那段文字的所有詞
+    rows = np.repeat(np.arange(len(codes)), per_row)
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+    return flat[starts[codes[rows]] + offset], np.asarray(docs, dtype=np.int64)[rows]
+
+
+def _strip_labels(text):
+    return _LABELS.sub(" ", text)
+
+
+def _document_pairs(frame, items, docs):
+    """frame 的專案（doc id 是 docs）+ 它們的 checklist 項目 -> {詞: doc id 陣列}。"""
+    terms = _Terms()
+    parts = [_pairs(terms, frame[c], docs, clean=_strip_labels if c == "Project_Spec" else None)
+             for c in TEXT_COLUMNS]
+    if len(items):
+        doc_of = pd.Series(docs, index=frame["Project_Name"].astype(str).to_numpy())
+        doc_of = doc_of[~doc_of.index.duplicated()]
+        item_docs = doc_of.reindex(items.index).to_numpy()
+        ok = ~np.isnan(item_docs)
+        item_docs = item_docs[ok].astype(np.int64)
+        text = items["item"][ok]
+        missing = ~items["done"].to_numpy()[ok]
+        parts.append(_pairs(terms, text, item_docs))
+        parts.append(_pairs(terms, text[missing], item_docs[missing], MISSING))
+    return _postings(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]), terms.names)
+
+
+def _postings(ids, doc_ids, names):
+    """(詞 id, doc) -> {詞: 排序好、不重複的 doc id 陣列}。"""
+    if len(ids) == 0:
+        return {}
+    # 詞 id 和 doc 合成一個整數一起排序 / 去重
+    width = int(doc_ids.max()) + 1
+    keys = np.sort(ids * width + doc_ids)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+    ids, doc_ids = keys // width, (keys % width).astype(np.int32)
+    bounds = np.flatnonzero(np.diff(ids)) + 1
+    return dict(zip([names[i] for i in ids[np.r_[0, bounds]]], np.split(doc_ids, bounds)))
+
+
+def _items_of(checklists, names):
+    items = checklists.items
+    return items[items.index.isin(names)] if len(items) else items
+
+
+def _identity(frame, checklists):
+    """(Project_ID index, 每個專案的 hash：索引的欄位 + 它的 checklist 項目 / 完成狀態)。"""
+    ids, hashes = project_identity(frame, TEXT_COLUMNS + ["Project_Name"])
+    items = checklists.items
+    if len(items):
+        item_hash = pd.Series(pd.util.hash_pandas_object(items[["kind", "item", "done"]], index=False).to_numpy(),
+                              index=items.index)
+        # 次序不影響結果，用加總合成一個專案的 hash（uint64 溢位沒關係）
+        per_name = item_hash.groupby(level=0).sum()
+        hashes = hashes ^ per_name.reindex(frame["Project_Name"].astype(str).to_numpy(), fill_value=0).to_numpy()
+    return ids, hashes
+
+
+class SearchIndex:
+    """一份 projects（+ checklist）的倒排索引：詞 -> doc id 陣列。
+
+    doc id 是專案第一次被索引時的位置，之後不變；positions 把 doc id 對應到目前 frame 的 row 位置
+    （-1 = 已刪除）。updated() 跟 analytics.Rollups 一樣用 Project_ID + hash 找出有改動的專案，
+    只改那些專案用到的詞（複製 dict，改到的詞換成新陣列），原本那份不變，其他 session 可以繼續用。
+    """
+
+    def __init__(self, frame, checklists, postings=None, doc_ids=None, identity=None):
+        self.frame = frame
+        self.checklists = checklists
+        self.ids, self.hashes = identity or _identity(frame, checklists)
+        if postings is None:
+            doc_ids = np.arange(len(frame), dtype=np.int32)
+            postings = _document_pairs(frame, checklists.items, doc_ids)
+        self.postings = postings
+        self.doc_ids = doc_ids
+        self.positions = np.full(int(doc_ids.max()) + 1 if len(doc_ids) else 0, -1, dtype=np.intp)
+        self.positions[doc_ids] = np.arange(len(doc_ids))
+        self._vocab = None
+
+    @property
+    def vocab(self):
+        # 排序好的所有詞，前綴比對用（第一次搜尋才建）
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        return self._vocab
+
+    def updated(self, frame, checklists):
+        identity = _identity(frame, checklists)
+        diff = changed_rows((self.ids, self.hashes), identity)
+        if diff is None:
+            return SearchIndex(frame, checklists, identity=identity)
+        pos, same, added, removed = diff
+
+        # 沒改動的專案沿用舊的 doc id；新增 / 有改動的專案給新的
+        doc_ids = np.empty(len(frame), dtype=np.int32)
+        doc_ids[same] = self.doc_ids[pos[same]]
+        doc_ids[added] = np.arange(len(self.positions), len(self.positions) + len(added), dtype=np.int32)
+        if len(added) == 0 and len(removed) == 0:
+            return SearchIndex(frame, checklists, self.postings, doc_ids, identity)
+
+        old = self.frame.iloc[removed]
+        before = _document_pairs(old, _items_of(self.checklists, old["Project_Name"].astype(str)), self.doc_ids[removed])
+        new = frame.iloc[added]
+        after = _document_pairs(new, _items_of(checklists, new["Project_Name"].astype(str)), doc_ids[added])
+        postings = dict(self.postings)
+        for term, docs in before.items():
+            left = np.setdiff1d(postings[term], docs, assume_unique=True)
+            if len(left):
+                postings[term] = left
+            else:
+                del postings[term]
+        for term, docs in after.items():
+            # 新的 doc id 一定比舊的大，接在後面還是排序好的
+            postings[term] = np.concatenate([postings[term], docs]) if term in postings else docs
+        return SearchIndex(frame, checklists, postings, doc_ids, identity)
+
+    def _docs(self, term, prefix):
+        if not prefix:
+            return self.postings.get(term, np.empty(0, dtype=np.int32))
+        vocab = self.vocab
+        lo = bisect.bisect_left(vocab, term)
+        hi = bisect.bisect_left(vocab, term + "\uffff")
+        if hi - lo == 1:
+            return self.postings[vocab[lo]]
+        return np.unique(np.concatenate([self.postings[t] for t in vocab[lo:hi]] or [np.empty(0, dtype=np.int32)]))
+
+    def find(self, text, missing_only=False):
+        """符合所有搜尋詞的專案 row 位置（排序好）；沒有可以搜尋的詞回傳 None（不篩選）。
+
+        missing_only：只找未完成的 checklist 項目。
+        """
+        terms = query_terms(text)
+        if not terms:
+            return None
+        prefix = MISSING if missing_only else ""
+        found = None
+        # 先處理結果少的詞，交集越做越小
+        for docs in sorted((self._docs(prefix + t, p) for t, p in terms), key=len):
+            found = docs if found is None else np.intersect1d(found, docs, assume_unique=True)
+            if len(found) == 0:
+                break
+        positions = self.positions[found]
+        return np.sort(positions[positions >= 0])
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pandas as pd
+
+
+# ==============================================
+# 工作表讀取快取（整個 process 共用）
+# ==============================================
+def frame_etag(frame):
+    """用內容雜湊做 etag：內容一樣，etag 就一樣。"""
+    if frame is None or frame.empty:
+        return "empty"
+    hashed = pd.util.hash_pandas_object(frame.astype(str), index=False)
+    return f"{len(frame)}-{int(hashed.sum()) & 0xFFFFFFFFFFFF:012x}"
+
+
+class _Entry:
+    __slots__ = ("frame", "etag", "loaded_at")
+
+    def __init__(self, frame, etag, loaded_at):
+        self.frame = frame
+        self.etag = etag
+        self.loaded_at = loaded_at
+
+
+class SheetCache:
+    """每個 worksheet 一份快取，過了 ttl 秒先重新讀取。
+
+    read_fn 要接受 conn.read 的參數（worksheet=..., ttl=..., usecols=...）。
+    同一個 worksheet 同時只會有一個 session 去讀 Google Sheets，其他 session 等結果。
+    每次讀到的內容（etag）跟上一次不同，version 會加一。
+    """
+
+    def __init__(self, read_fn, ttl=60):
+        self._read = read_fn
+        self.ttl = ttl
+        self._entries = {}
+        self._versions = {}
+        self._etags = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, worksheet):
+        with self._guard:
+            if worksheet not in self._locks:
+                self._locks[worksheet] = threading.Lock()
+            return self._locks[worksheet]
+
+    def _fresh(self, entry):
+        return entry is not None and time.monotonic() - entry.loaded_at < self.ttl
+
+    def read(self, worksheet, **kwargs):
+        entry = self._entries.get(worksheet)
+        if not self._fresh(entry):
+            with self._lock_for(worksheet):
+                entry = self._entries.get(worksheet)
+                if not self._fresh(entry):
+                    frame = self._read(worksheet=worksheet, ttl=0, **kwargs)
+                    etag = frame_etag(frame)
+                    if self._etags.get(worksheet) != etag:
+                        self._etags[worksheet] = etag
+                        self._versions[worksheet] = self._versions.get(worksheet, 0) + 1
+                    entry = _Entry(frame, etag, time.monotonic())
+                    self._entries[worksheet] = entry
+        return entry.frame.copy()
+
+    def invalidate(self, worksheet):
+        with self._lock_for(worksheet):
+            self._entries.pop(worksheet, None)
+
+    def version(self, worksheet):
+        return self._versions.get(worksheet, 0)
+
+    def etag(self, worksheet):
+        return self._etags.get(worksheet)
@@ -0,0 +1,102 @@
+import threading
+import time
+from functools import cached_property
+
+from analytics import Rollups
+from checklist import ChecklistStore
+from forecast import forecast
+from progress import with_progress
+from projects import parse_projects
+from query import ProjectQuery
+from search import SearchIndex
+from timeline import Timeline
+
+
+# ==============================================
+# 整個 process 共用一份解析好的資料（唯讀）
+# ==============================================
+class Snapshot:
+    """某個資料版本解析好的結果：df / checklists / all_df（含 progress、checklist 狀態、延誤預測）/ query /
+    rollups / search。
+
+    所有 session 共用同一份，不可以修改；要改的 row 先用 projects.project_record 複製出來。
+    previous 是上一份 snapshot：統計 rollup 和搜尋索引只重算有改動的專案。
+    """
+
+    def __init__(self, projects_raw, checklist_raw, today, key, versions, previous=None):
+        self.key = key
+        self.versions = versions
+        self.timings = {}
+        t = time.perf_counter()
+        self.df = parse_projects(projects_raw, today)
+        self.timings["parse"] = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        self.checklists = ChecklistStore.from_sheet(checklist_raw)
+        self.timings["parse_checklist"] = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        self.rollups = previous.rollups.updated(self.df, today) if previous else Rollups(self.df, today)
+        self.timings["rollups"] = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        self.search = previous.search.updated(self.df, self.checklists) if previous \
+            else SearchIndex(self.df, self.checklists)
+        self.timings["search"] = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        # progress / color / checklist 狀態 / 預測 + 篩選 index 只在建 snapshot 時算一次
+        all_df = self.checklists.with_status(with_progress(self.df, today))
+        self.all_df = all_df.join(forecast(all_df, self.rollups, today))
+        self.query = ProjectQuery(self.all_df, self.search)
+        self.timings["index"] = (time.perf_counter() - t) * 1000
+        self.built_at = time.time()
+        self.checked = time.monotonic()
+
+    @cached_property
+    def timeline(self):
+        # 第一次有人開時間線才建（long format 比 all_df 大好幾倍）
+        return Timeline(self.all_df)
+
+
+class SnapshotStore:
+    """目前的 Snapshot。資料版本沒變就直接給同一份，有變才重新讀取、解析，建好後整份換掉。
+
+    版本 = (日期, change feed 的 seq) 加上 backend.versions()；
+    過了 max_age 秒會經後端快取重讀一次，內容一樣就沿用舊的。存檔後呼叫 invalidate()。
+    """
+
+    def __init__(self, backend, max_age=60):
+        self.backend = backend
+        self.max_age = max_age
+        self._current = None
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def _usable(self, snap, key):
+        return (snap is not None and not self._stale and snap.key == key
+                and time.monotonic() - snap.checked < self.max_age
+                and snap.versions == self.backend.versions())
+
+    def get(self, today, seq=0):
+        key = (today, seq)
+        snap = self._current
+        if self._usable(snap, key):
+            return snap
+        with self._lock:
+            snap = self._current
+            if self._usable(snap, key):
+                return snap
+            # 同一時間只有一個 session 在讀取 / 解析，其他 session 等它建好
+            stale, self._stale = self._stale, False
+            t = time.perf_counter()
+            projects_raw = self.backend.read_projects()
+            checklist_raw = self.backend.read_checklist()
+            load_ms = (time.perf_counter() - t) * 1000
+            versions = self.backend.versions()
+            if snap is not None and not stale and snap.key == key and snap.versions == versions:
+                snap.checked = time.monotonic()
+                return snap
+            snap = Snapshot(projects_raw, checklist_raw, today, key, versions, previous=snap)
+            snap.timings["load"] = load_ms
+            self._current = snap
+            return snap
+
+    def invalidate(self):
+        self._stale = True
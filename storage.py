@@ -0,0 +1,453 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from audit import AUDIT_COLUMNS, audit_entries
+from persistence import (ChangeSet, ConflictError, SheetTable, as_revision, conflict, fill_project_ids,
+                         merge_fields, name_conflict, name_project_id, rowcol_to_a1, to_cell)
+from sheet_cache import SheetCache
+
+
+# ==============================================
+# 儲存後端：Google Sheets / 本機 SQLite
+# ==============================================
+PROJECT_COLUMNS = ["Project_Type","Project_Name","Year","Lead_Time","Customer","Supervisor",
+                   "Qty","Real_Count","Project_Spec","Description","Progress_Reminder",
+                   "Parts_Arrival","Installation_Complete","Testing_Complete","Cleaning_Complete","Delivery_Complete",
+                   "Project_ID","Revision"]
+CHECKLIST_COLUMNS = ["Project_Name", "Checklist_Data"]
+# Google Sheets 的 change feed：meta worksheet 第 1 / 2 行記錄 projects / checklist 最後寫入時間
+FEED_WORKSHEET = "meta"
+# 改動記錄（試算表有這個 worksheet 才記錄）
+AUDIT_WORKSHEET = "audit"
+FEED_ROWS = {"projects": 1, "checklist": 2}
+
+
+def _quote(column):
+    return f'"{column}"'
+
+
+def _text(value):
+    # 跟 Google Sheets 一樣全部存成文字，讀回來再由 app 轉型
+    value = to_cell(value)
+    return value if isinstance(value, str) else str(value)
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class StorageBackend:
+    """所有後端共用的介面。
+
+    read_* 回傳跟 Google Sheets 一樣格式的原始 DataFrame（日期是字串），
+    save_* 接受 persistence.ChangeSet，只寫有改動的 row。
+    projects 以 Project_ID 為 key，每次寫入 Revision + 1；ChangeSet 帶 base 的改動會先檢查版本號，
+    別人先改過的欄位不寫，丟 persistence.ConflictError。checklist 以 Project_Name 為 key。
+    save_projects 寫入的改動同時加到改動記錄（audit.AUDIT_COLUMNS，只會 append）。
+    """
+
+    label = ""
+
+    def read_projects(self):
+        raise NotImplementedError
+
+    def read_checklist(self):
+        raise NotImplementedError
+
+    def save_projects(self, changes):
+        raise NotImplementedError
+
+    def save_checklist(self, changes):
+        raise NotImplementedError
+
+    def commit_projects(self, changes):
+        """save_projects，再寫跟著寫入成功的專案的 checklist 改動（changes.checklist）。
+
+        專案被拒絕（刪除 / 改名衝突）的話它的 checklist 不動，不會專案還在、checklist 卻不見了。
+        """
+        conflicts = []
+        try:
+            self.save_projects(changes)
+        except ConflictError as exc:
+            conflicts = exc.conflicts
+        rejected = {c["key"] for c in conflicts if c["field"] in (None, "Project_Name")}
+        follow = ChangeSet()
+        for key, checklist in changes.checklist.items():
+            if key not in rejected:
+                follow.merge(checklist)
+        if follow:
+            self.save_checklist(follow)
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def read_audit(self, project_id=None, since=None):
+        """改動記錄（依寫入次序）：只要一個專案 / since（ISO 時間文字）之後的。不支援就回傳空的。"""
+        return pd.DataFrame(columns=AUDIT_COLUMNS)
+
+    def refresh(self, *tables):
+        """丟掉快取（沒指定就全部），下次讀取拿最新資料。"""
+
+    def change_token(self):
+        """很便宜地檢查資料有沒有變：回傳 {worksheet: token}，token 變了代表資料變了
+        （後端自己會丟掉過期的快取）。不支援就回傳 None。"""
+        return None
+
+    def versions(self):
+        """{"projects": n, "checklist": n}，資料有變 n 就會變。"""
+        raise NotImplementedError
+
+
+class GSheetsBackend(StorageBackend):
+    """Google Sheets。
+
+    試算表有 meta worksheet 的話，每次寫入會在上面記一個 token，change_token() 只讀那兩格；
+    有人在用 change feed 時快取改成由 token 失效，最多 revalidate 秒整份重讀一次
+    （抓直接在 Google Sheets 上改的資料）。沒有 meta 的話 change_token() 照快取 ttl 重讀。
+    """
+
+    label = "Google Sheets"
+
+    def __init__(self, conn, ttl=60, revalidate=600):
+        self._conn = conn
+        self.revalidate = revalidate
+        self._meta_ws = None
+        self._audit_ws = None
+        # 已經讀到的改動記錄（只會 append：之後只讀新增的 row）
+        self._audit_log = pd.DataFrame(columns=AUDIT_COLUMNS)
+        self._audit_read = None
+        self._audit_lock = threading.Lock()
+        self._tokens = {}
+        self.cache = SheetCache(self._read, ttl=ttl)
+        self.projects_table = SheetTable(conn, "projects", PROJECT_COLUMNS, key="Project_ID",
+                                         revision="Revision", legacy=("Project_Name", name_project_id),
+                                         unique="Project_Name")
+        self.checklist_table = SheetTable(conn, "checklist", CHECKLIST_COLUMNS)
+
+    def _read(self, worksheet, **kwargs):
+        frame = self._conn.read(worksheet=worksheet, **kwargs)
+        return fill_project_ids(frame) if worksheet == "projects" else frame
+
+    def read_projects(self):
+        return self.cache.read("projects")
+
+    def read_checklist(self):
+        return self.cache.read("checklist")
+
+    def _commit(self, table, sheet_table, changes):
+        try:
+            sheet_table.commit(changes)
+        except ConflictError:
+            # 沒衝突的部分已經寫入
+            self._saved(table)
+            raise
+        self._saved(table)
+
+    def _saved(self, table):
+        self.cache.invalidate(table)
+        self._touch(table)
+
+    def save_projects(self, changes):
+        # 寫入成功才記錄（寫入失敗、write-behind 重試時不會重複記）；衝突的話只記有寫入的部分
+        try:
+            self._commit("projects", self.projects_table, changes)
+        except ConflictError as exc:
+            self._append_audit(audit_entries(changes, PROJECT_COLUMNS, exc.conflicts))
+            raise
+        self._append_audit(audit_entries(changes, PROJECT_COLUMNS))
+
+    def save_checklist(self, changes):
+        self._commit("checklist", self.checklist_table, changes)
+
+    def refresh(self, *tables):
+        for t in tables or ("projects", "checklist"):
+            self.cache.invalidate(t)
+        if not tables:
+            self._audit_read = None
+
+    def _meta(self):
+        if self._meta_ws is None:
+            try:
+                self._meta_ws = self._conn.client._select_worksheet(worksheet=FEED_WORKSHEET)
+            except Exception:
+                # 沒有 meta worksheet：不用 change feed
+                self._meta_ws = False
+        return self._meta_ws or None
+
+    def _audit(self):
+        if self._audit_ws is None:
+            try:
+                self._audit_ws = self._conn.client._select_worksheet(worksheet=AUDIT_WORKSHEET)
+                if not [h for h in self._audit_ws.row_values(1) if h]:
+                    self._audit_ws.update(range_name="A1", values=[AUDIT_COLUMNS])
+            except Exception:
+                # 沒有 audit worksheet：不記錄
+                self._audit_ws = False
+        return self._audit_ws or None
+
+    def _append_audit(self, entries):
+        ws = self._audit() if entries else None
+        if ws is None:
+            return
+        try:
+            # 一次存檔一個 append_rows；RAW：時間 / 舊值照原樣存成文字
+            ws.append_rows([[e[c] for c in AUDIT_COLUMNS] for e in entries],
+                           value_input_option="RAW", table_range="A1")
+        except Exception:
+            # 資料已經寫入，記錄寫不進去不影響存檔
+            pass
+        # 下次讀取補上新的 row（只讀尾巴，不重讀整份）
+        self._audit_read = None
+
+    def _audit_rows(self, ws):
+        """目前的改動記錄。記錄只會 append 不會改：第一次整份讀一次，之後只讀上次之後新增的 row，
+        過了快取 ttl（或自己寫入後）才再問一次。"""
+        with self._audit_lock:
+            if self._audit_read is None or time.monotonic() - self._audit_read >= self.cache.ttl:
+                last = rowcol_to_a1(1, len(AUDIT_COLUMNS))[:-1]
+                rows = ws.get(f"A{len(self._audit_log) + 2}:{last}")
+                if rows:
+                    width = len(AUDIT_COLUMNS)
+                    new = pd.DataFrame([(list(r) + [""] * width)[:width] for r in rows], columns=AUDIT_COLUMNS)
+                    self._audit_log = pd.concat([self._audit_log, new], ignore_index=True)
+                self._audit_read = time.monotonic()
+            return self._audit_log
+
+    def read_audit(self, project_id=None, since=None):
+        ws = self._audit()
+        if ws is None:
+            return super().read_audit()
+        log = self._audit_rows(ws).fillna("").astype(str)
+        if project_id is not None:
+            log = log[log["Project_ID"] == project_id]
+        if since is not None:
+            log = log[log["Timestamp"] > since]
+        return log.reset_index(drop=True)
+
+    def _touch(self, table):
+        ws = self._meta()
+        if ws is None:
+            return
+        row = FEED_ROWS[table]
+        try:
+            ws.update(range_name=f"A{row}:B{row}", values=[[table, f"{time.time():.6f}"]])
+        except Exception:
+            # token 寫不進去只是別人晚一點才看到，revalidate 會補上
+            pass
+
+    def change_token(self):
+        ws = self._meta()
+        if ws is None:
+            # 沒有 meta worksheet：經共用快取讀取（每 ttl 秒最多一次），用內容 etag 當 token
+            for t in FEED_ROWS:
+                self.cache.read(t)
+            return {t: self.cache.etag(t) for t in FEED_ROWS}
+        values = ws.get(f"A1:B{len(FEED_ROWS)}")
+        self.cache.ttl = max(self.cache.ttl, self.revalidate)
+        token = {row[0]: row[1] for row in values if len(row) > 1}
+        for t, value in token.items():
+            if self._tokens.get(t, value) != value:
+                self.cache.invalidate(t)
+        self._tokens = token
+        return token
+
+    def versions(self):
+        return {"projects": self.cache.version("projects"), "checklist": self.cache.version("checklist")}
+
+
+class SQLiteBackend(StorageBackend):
+    """本機 SQLite 檔案。第一次開新檔案時會從 projects_data.json / checklist_data.json 匯入。
+
+    projects 以 Project_ID 為 primary key，Project_Name 有 unique index：新增 / 改名撞到別的專案的名字
+    不寫入，回報成衝突（persistence.name_conflict）。
+    """
+
+    label = "local database"
+
+    def __init__(self, path, seed_dir=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._create()
+        if seed_dir is not None:
+            self._seed(seed_dir)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _create(self):
+        types = {"Project_ID": "TEXT PRIMARY KEY", "Revision": "INTEGER NOT NULL DEFAULT 0"}
+        cols = ", ".join(f'{_quote(c)} {types.get(c, "TEXT")}' for c in PROJECT_COLUMNS)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(f"CREATE TABLE IF NOT EXISTS projects ({cols})")
+            # 舊版資料庫沒有 Project_ID / Revision：補欄位，ID 由 Project_Name 算
+            existing = {r[1] for r in con.execute("PRAGMA table_info(projects)")}
+            for c in ("Project_ID", "Revision"):
+                if c not in existing:
+                    con.execute(f"ALTER TABLE projects ADD COLUMN {_quote(c)} {'INTEGER NOT NULL DEFAULT 0' if c == 'Revision' else 'TEXT'}")
+            missing = con.execute('SELECT rowid, "Project_Name" FROM projects '
+                                  'WHERE "Project_ID" IS NULL OR "Project_ID" = \'\'').fetchall()
+            con.executemany('UPDATE projects SET "Project_ID" = ? WHERE rowid = ?',
+                            [(name_project_id(name), rowid) for rowid, name in missing])
+            primary = [r[1] for r in con.execute("PRAGMA table_info(projects)") if r[5]]
+            if primary != ["Project_ID"]:
+                # 舊版以 Project_Name 為 primary key：SQLite 不能改 primary key，搬到新的表（保留次序）
+                con.execute("DROP INDEX IF EXISTS idx_projects_id")
+                con.execute(f"CREATE TABLE projects_new ({cols})")
+                names = ", ".join(map(_quote, PROJECT_COLUMNS))
+                con.execute(f"INSERT INTO projects_new ({names}) SELECT {names} FROM projects ORDER BY rowid")
+                con.execute("DROP TABLE projects")
+                con.execute("ALTER TABLE projects_new RENAME TO projects")
+            # 名字不可以重複（checklist 以 Project_Name 對應）；撞名由 _commit 回報成衝突
+            con.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_projects_name ON projects ("Project_Name") '
+                        'WHERE "Project_Name" <> \'\'')
+            con.execute('CREATE INDEX IF NOT EXISTS idx_projects_year ON projects ("Year")')
+            con.execute('CREATE INDEX IF NOT EXISTS idx_projects_type ON projects ("Project_Type")')
+            con.execute('CREATE INDEX IF NOT EXISTS idx_projects_lead_time ON projects ("Lead_Time")')
+            con.execute('CREATE TABLE IF NOT EXISTS checklist ("Project_Name" TEXT PRIMARY KEY, "Checklist_Data" TEXT)')
+            # 改動記錄只會 INSERT；用 Project_ID / Timestamp 的 index 查，不用掃整份
+            audit_cols = ", ".join(f"{_quote(c)} TEXT" for c in AUDIT_COLUMNS)
+            con.execute(f"CREATE TABLE IF NOT EXISTS audit ({audit_cols})")
+            con.execute('CREATE INDEX IF NOT EXISTS idx_audit_project ON audit ("Project_ID")')
+            con.execute('CREATE INDEX IF NOT EXISTS idx_audit_time ON audit ("Timestamp")')
+            con.execute('CREATE TABLE IF NOT EXISTS revisions ("name" TEXT PRIMARY KEY, "revision" INTEGER NOT NULL)')
+            con.executemany('INSERT OR IGNORE INTO revisions VALUES (?, 0)', [("projects",), ("checklist",)])
+
+    def _seed(self, seed_dir):
+        with self._connect() as con:
+            if con.execute("SELECT COUNT(*) FROM projects").fetchone()[0]:
+                return
+        projects = _load_json(os.path.join(seed_dir, "projects_data.json"), [])
+        checklists = _load_json(os.path.join(seed_dir, "checklist_data.json"), {})
+
+        changes = ChangeSet()
+        for p in projects:
+            if p.get("Project_Name"):
+                changes.add(p.get("Project_ID") or name_project_id(p["Project_Name"]), p)
+        self.save_projects(changes)
+        changes = ChangeSet()
+        for name, checklist in checklists.items():
+            changes.add(name, {"Project_Name": name, "Checklist_Data": json.dumps(checklist, ensure_ascii=False)})
+        self.save_checklist(changes)
+
+    def _read(self, table, columns):
+        with self._connect() as con:
+            frame = pd.read_sql_query(f"SELECT * FROM {table} ORDER BY rowid", con)
+        return frame.reindex(columns=columns) if frame.empty else frame
+
+    def read_projects(self):
+        return self._read("projects", PROJECT_COLUMNS)
+
+    def read_checklist(self):
+        return self._read("checklist", CHECKLIST_COLUMNS)
+
+    def _commit(self, table, columns, changes, key="Project_Name", revision=None, audit=False):
+        if not changes:
+            return
+        inserts = [{**r, key: k, **({revision: 1} if revision else {})} for k, r in changes.added.items()]
+        conflicts = []
+        where = f"WHERE {_quote(key)} = ?"
+        with self._lock, self._connect() as con:
+            # 先拿寫入鎖，檢查版本號和寫入在同一個交易內
+            con.execute("BEGIN IMMEDIATE")
+            con.row_factory = sqlite3.Row
+            for k in changes.deleted:
+                base = changes.base.get(k) if revision else None
+                if base is None:
+                    con.execute(f"DELETE FROM {table} {where}", (k,))
+                    continue
+                cur = con.execute(f"DELETE FROM {table} {where} AND {_quote(revision)} = ?",
+                                  (k, as_revision(base.get(revision))))
+                if cur.rowcount == 0 and con.execute(f"SELECT 1 FROM {table} {where}", (k,)).fetchone():
+                    conflicts.append(conflict(k, base))
+            for k, (record, fields) in changes.updated.items():
+                fields = [f for f in (fields or columns) if f in columns and f != revision]
+                base = changes.base.get(k) if revision else None
+                if base is not None:
+                    row = con.execute(f"SELECT * FROM {table} {where}", (k,)).fetchone()
+                    if row is None:
+                        conflicts.append(conflict(k, record))
+                        continue
+                    if as_revision(row[revision]) != as_revision(base.get(revision)):
+                        theirs = dict(row)
+                        fields, clash = merge_fields(fields, base, record, theirs)
+                        conflicts.extend(conflict(k, record, f, theirs.get(f)) for f in clash)
+                if not fields:
+                    continue
+                assignments = ", ".join(f"{_quote(f)} = ?" for f in fields)
+                if revision:
+                    assignments += f", {_quote(revision)} = {_quote(revision)} + 1"
+                try:
+                    cur = con.execute(f"UPDATE {table} SET {assignments} {where}",
+                                      [_text(record.get(f)) for f in fields] + [k])
+                except sqlite3.IntegrityError:
+                    # 改名改成別的專案的名字
+                    conflicts.append(name_conflict(k, record))
+                    continue
+                if cur.rowcount == 0:
+                    inserts.append({**record, key: k, **({revision: 1} if revision else {})})
+            # projects：一般 INSERT，撞到已有的 ID / 名字就是衝突（不可以把別人的專案蓋掉）；
+            # checklist 以 Project_Name 為 key，整份取代
+            insert = f"INSERT {'' if revision else 'OR REPLACE '}INTO {table} ({', '.join(map(_quote, columns))}) " \
+                     f"VALUES ({', '.join('?' * len(columns))})"
+            for r in inserts:
+                try:
+                    con.execute(insert, [_text(r.get(c)) for c in columns])
+                except sqlite3.IntegrityError:
+                    conflicts.append(name_conflict(r[key], r))
+            if audit:
+                # 跟資料在同一個交易：寫入成功才有記錄
+                entries = audit_entries(changes, columns, conflicts)
+                con.executemany(f"INSERT INTO audit VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})",
+                                [[_text(e[c]) for c in AUDIT_COLUMNS] for e in entries])
+            con.execute("UPDATE revisions SET revision = revision + 1 WHERE name = ?", (table,))
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def save_projects(self, changes):
+        self._commit("projects", PROJECT_COLUMNS, changes, key="Project_ID", revision="Revision", audit=True)
+
+    def save_checklist(self, changes):
+        self._commit("checklist", CHECKLIST_COLUMNS, changes)
+
+    def read_audit(self, project_id=None, since=None):
+        where, params = [], []
+        if project_id is not None:
+            where.append('"Project_ID" = ?')
+            params.append(project_id)
+        if since is not None:
+            where.append('"Timestamp" > ?')
+            params.append(since)
+        sql = "SELECT * FROM audit" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY rowid"
+        with self._connect() as con:
+            return pd.read_sql_query(sql, con, params=params).reindex(columns=AUDIT_COLUMNS)
+
+    def versions(self):
+        with self._connect() as con:
+            return dict(con.execute("SELECT name, revision FROM revisions").fetchall())
+
+    def change_token(self):
+        return self.versions()
+
+
+def open_backend(name, conn_factory=None, ttl=60, sqlite_path="dashboard.db", seed_dir=None, revalidate=600):
+    """依設定開啟後端：'gsheets'（預設）或 'sqlite'。"""
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path, seed_dir=seed_dir)
+    if name != "gsheets":
+        raise ValueError(f"Unknown storage backend: {name}")
+    return GSheetsBackend(conn_factory(), ttl=ttl, revalidate=revalidate)
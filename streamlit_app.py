@@ -1,108 +1,206 @@
+import os
+from functools import partial
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
+import numpy as np
 import pandas as pd
-import json
-from datetime import date
+from datetime import date, datetime
+from persistence import ChangeSet, ConflictError, diff_fields, new_project_id
+from checklist import checklist_json
+from storage import PROJECT_COLUMNS, open_backend
+from projects import DATE_COLUMNS, SPEC_FIELDS, day_to_timestamp, format_spec, parse_projects, project_record
+from audit import as_of, project_history
+from write_queue import WriteBehindBackend
+from offline import OfflineCacheBackend
+from snapshot import SnapshotStore
+from search import TEXT_COLUMNS
+from forecast import AT_RISK
+from bulk_io import EXPORT_FORMATS, IMPORT_TYPES, export_projects, import_projects
+from profiling import Profiler, ProfileLog
+from change_feed import CARD_FIELDS, ChangeFeed, changed_checklists, changed_projects
 
 # ==============================================
-# Google Sheets 連接（永久儲存）
+# 資料儲存（Google Sheets 或本機 SQLite）
 # ==============================================
 st.set_page_config(layout="wide")
-conn = st.connection('gsheets', type=GSheetsConnection)
-
-# 讀取 projects（ttl=0：不快取，永遠讀最新）
-df = conn.read(worksheet="projects", usecols=list(range(16)), ttl=0)
-df = df.dropna(how="all")
-
-required = ["Project_Type","Project_Name","Year","Lead_Time","Customer","Supervisor",
-            "Qty","Real_Count","Project_Spec","Description","Progress_Reminder",
-            "Parts_Arrival","Installation_Complete","Testing_Complete","Cleaning_Complete","Delivery_Complete"]
-
-if df.empty:
-    df = pd.DataFrame(columns=required)
-
-for c in required:
-    if c not in df.columns:
-        df[c] = "" if c != "Year" else 2025
-
-date_cols = ["Lead_Time","Parts_Arrival","Installation_Complete","Testing_Complete","Cleaning_Complete","Delivery_Complete"]
-for c in date_cols:
-    df[c] = pd.to_datetime(df[c], errors="coerce")
-
-df["Year"] = pd.to_numeric(df["Year"], errors="coerce").fillna(date.today().year).astype(int)
-df["Qty"] = pd.to_numeric(df["Qty"], errors="coerce").fillna(1).astype(int)
-df["Real_Count"] = pd.to_numeric(df["Real_Count"], errors="coerce").fillna(df["Qty"]).astype(int)
-
-# 讀取 checklist
-checklist_raw = conn.read(worksheet="checklist", ttl=0)
-checklist_db = {}
-if not checklist_raw.empty:
-    for _, row in checklist_raw.iterrows():
-        if "Project_Name" in row and "Checklist_Data" in row and pd.notna(row["Checklist_Data"]):
-            try:
-                checklist_db[row["Project_Name"]] = json.loads(row["Checklist_Data"])
-            except:
-                pass
-
-# 儲存函數
-def save_projects():
-    df_save = df.copy()
-    for c in date_cols:
-        df_save[c] = df_save[c].apply(lambda x: x.strftime("%Y-%m-%d") if pd.notna(x) else None)
-    conn.update(worksheet="projects", data=df_save)
-
-def save_checklist():
-    if not checklist_db:
-        empty_df = pd.DataFrame(columns=["Project_Name", "Checklist_Data"])
-        conn.update(worksheet="checklist", data=empty_df)
-    else:
-        checklist_list = [{"Project_Name": k, "Checklist_Data": json.dumps(v, ensure_ascii=False)} for k, v in checklist_db.items()]
-        checklist_save = pd.DataFrame(checklist_list)
-        conn.update(worksheet="checklist", data=checklist_save)
+profiler = Profiler()
+
+def setting(key, default):
+    # 設定放在 .streamlit/secrets.toml 的 [dashboard] 底下
+    try:
+        return st.secrets.get("dashboard", {}).get(key, default)
+    except:
+        return default
+
+def gsheets_connection():
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection('gsheets', type=GSheetsConnection)
+
+@st.cache_resource
+def get_profile_log(path):
+    # 所有 session 的 rerun 計時（debug 面板 / JSON lines 匯出）
+    return ProfileLog(path=path or None)
+
+profile_log = get_profile_log(setting("profile_log_path", ""))
+
+def log_flush(table, n_changes, ms, ok):
+    profile_log.timing("sync", f"flush_{table}", ms, changes=n_changes, ok=ok)
+
+@st.cache_resource
+def get_backend(name, ttl, sqlite_path, write_behind, revalidate, cache_dir):
+    # 所有 session 共用同一個後端（連同讀取快取），存檔時只 invalidate 改過的 worksheet
+    backend = open_backend(name, conn_factory=gsheets_connection, ttl=ttl, sqlite_path=sqlite_path,
+                           seed_dir=os.path.dirname(os.path.abspath(__file__)), revalidate=revalidate)
+    journal = None
+    if cache_dir and name == "gsheets":
+        # 離線快取：開機先用本機那份，連不上 Google Sheets 也看得到最後一次的資料
+        backend = OfflineCacheBackend(backend, cache_dir)
+        journal = os.path.join(cache_dir, "pending_changes.json")
+    # write-behind：存檔立即回傳，由背景 thread 批次寫入（離線時的改動存在 journal，連得上再寫）
+    return WriteBehindBackend(backend, on_flush=log_flush, journal_path=journal) if write_behind else backend
+
+backend = get_backend(setting("backend", "gsheets"), int(setting("cache_ttl_seconds", 60)),
+                      setting("sqlite_path", "dashboard.db"), bool(setting("write_behind", True)),
+                      int(setting("revalidate_seconds", 600)), setting("offline_cache_dir", ".dashboard_cache"))
+# 離線快取在 write-behind 裡面
+cache = getattr(backend, "backend", backend)
+cache = cache if isinstance(cache, OfflineCacheBackend) else None
+
+@st.cache_resource
+def get_change_feed(_backend, backend_id, interval):
+    # 整個 process 一個 feed：不管開了幾個畫面，每 interval 秒只問後端一次有沒有改動
+    return ChangeFeed(_backend, interval=interval)
+
+live_every = float(setting("live_refresh_seconds", 15))
+feed = get_change_feed(backend, id(backend), live_every or 15.0)
+# 先 poll 再讀取：有改動的話快取已經失效
+feed_seq = feed.poll() if live_every else feed.seq
+
+@st.cache_resource
+def get_snapshots(_backend, backend_id, max_age):
+    # 所有 session 共用同一份解析好的資料（唯讀），資料有變才重建、整份換掉
+    return SnapshotStore(_backend, max_age=max_age)
+
+snapshots = get_snapshots(backend, id(backend), int(setting("cache_ttl_seconds", 60)))
+
+# 讀取 projects + checklist：版本沒變就直接用別的 session 已經解析好的那份
+today = date.today()
+with profiler.span("snapshot"):
+    try:
+        snap = snapshots.get(today, feed_seq)
+    except Exception as e:
+        # 連不上而且本機也沒有快取
+        st.error(f"Could not load data from {backend.label}: {type(e).__name__}: {e}")
+        st.stop()
+if snap.built_at >= profiler.started:
+    for name, ms in snap.timings.items():
+        profiler.add(name, ms)
+# 共用資料不可以修改：要改的 row 先用 project_record 複製，存檔後整份重建
+df, checklists, all_df, project_query = snap.df, snap.checklists, snap.all_df, snap.query
+
+required = PROJECT_COLUMNS
+# Project_ID / Revision 由存檔時自動處理，不在表單上
+editable = [c for c in required if c not in ("Project_ID", "Revision")]
+
+# 整頁重跑：資料是最新的，之前即時更新的卡片不用再疊上去
+st.session_state.feed_seq = feed_seq
+st.session_state.live_patches = {}
+
+def current_user():
+    # 有登入（st.login）用登入的 email，不然用側邊欄填的名字
+    try:
+        if st.user.is_logged_in:
+            return st.user.get("email") or st.user.get("name") or ""
+    except:
+        pass
+    return st.session_state.get("audit_user", "").strip()
+
+# 儲存函數（只寫有改動的 row；回傳跟別人衝突、沒寫入的欄位）
+def save_projects(changes):
+    t = Profiler()
+    conflicts = []
+    # 改動記錄的時間 / 使用者（背景寫入的話不是寫入時才記）
+    changes.stamp(current_user())
+    with t.span("save_projects"):
+        try:
+            backend.commit_projects(changes)
+        except ConflictError as exc:
+            conflicts = exc.conflicts
+    snapshots.invalidate()
+    profile_log.add(t.record("save", changes=len(changes)))
+    return conflicts
+
+def save_checklist(changes):
+    t = Profiler()
+    with t.span("save_checklist"):
+        backend.save_checklist(changes)
+    snapshots.invalidate()
+    profile_log.add(t.record("save", changes=len(changes)))
+
+def export_as_of(when, fmt):
+    # 目前的資料往回倒推到 when 那天結束：只讀那之後的改動記錄
+    end = (pd.Timestamp(when) + pd.Timedelta(days=1)).isoformat()
+    frame = as_of(backend.read_projects(), backend.read_audit(since=end), end, PROJECT_COLUMNS)
+    return export_projects(parse_projects(frame, today), fmt)
+
+def checklist_record(project_name, checklist):
+    return {"Project_Name": project_name,
+            "Checklist_Data": checklist_json(checklist)}
+
+def project_base(row, fields):
+    # 編輯前的值 + 版本號，存檔時用來偵測別人有沒有先改過
+    return {"Revision": row["Revision"], "Project_Name": row["Project_Name"], **{f: row[f] for f in fields}}
+
+def update_project(row, updated):
+    fields = diff_fields(row, updated, editable)
+    if not fields:
+        return []
+    changes = ChangeSet()
+    changes.update(row["Project_ID"], {**updated, "Project_ID": row["Project_ID"]}, fields,
+                   base=project_base(row, fields))
+    # 改名：checklist 跟著新名字（改名寫入成功才搬）
+    old_name, new_name = row["Project_Name"], updated["Project_Name"]
+    if old_name != new_name and old_name in checklists:
+        cl_changes = changes.checklist[row["Project_ID"]] = ChangeSet()
+        cl_changes.delete(old_name)
+        cl_changes.add(new_name, checklist_record(new_name, checklists.get(old_name)))
+    return save_projects(changes)
+
+def delete_project(row):
+    project_name = row["Project_Name"]
+    changes = ChangeSet()
+    # base 帶整筆記錄：改動記錄要留著刪除前的資料
+    changes.delete(row["Project_ID"], base=project_base(project_record(row), editable))
+    # 專案真的刪掉才刪 checklist
+    if project_name in checklists:
+        changes.checklist[row["Project_ID"]] = ChangeSet()
+        changes.checklist[row["Project_ID"]].delete(project_name)
+    return save_projects(changes)
+
+def conflict_text(c):
+    if c.get("duplicate"):
+        return f"**{c['name']}**: another project already uses this name — not saved"
+    if c["field"] is None:
+        return f"**{c['name']}** was changed or deleted by someone else — reload and try again"
+    return f"**{c['name']}** · {c['field']}: someone else saved “{c['theirs']}”, yours (“{c['mine']}”) was not saved"
 
 # ==============================================
-# 進度計算 + 顏色
+# 顯示格式
 # ==============================================
-def calculate_progress(row):
-    p = 0
-    today = date.today()
-    if pd.notna(row.get("Parts_Arrival")) and row["Parts_Arrival"].date() < today:
-        p += 30
-    if pd.notna(row.get("Installation_Complete")) and row["Installation_Complete"].date() < today:
-        p += 40
-    if pd.notna(row.get("Testing_Complete")) and row["Testing_Complete"].date() < today:
-        p += 10
-    if pd.notna(row.get("Cleaning_Complete")) and row["Cleaning_Complete"].date() < today:
-        p += 10
-    if pd.notna(row.get("Delivery_Complete")) and row["Delivery_Complete"].date() < today:
-        p += 10
-    return min(p, 100)
-
-def get_color(pct):
-    if pct >= 100: return "#0066ff"
-    elif pct >= 90: return "#00aa00"
-    elif pct >= 70: return "#66cc66"
-    elif pct >= 30: return "#ffaa00"
-    else: return "#ff4444"
-
 def fmt(d):
-    return pd.to_datetime(d).strftime("%Y-%m-%d") if pd.notna(d) else "—"
+    # 日期欄位是 Int32 日數
+    return day_to_timestamp(d).strftime("%Y-%m-%d") if pd.notna(d) else "—"
 
 # ==============================================
 # 專案卡片渲染函數（只顯示卡片 + Checklist，不含 Edit/Delete）
 # ==============================================
-def render_project_card(row, idx):
-    pct = calculate_progress(row)
-    color = get_color(pct)
+def render_project_card(row, pid):
+    pct = int(row["progress"])
+    color = row["color"]
 
     project_name = row["Project_Name"]
-    current_check = checklist_db.get(project_name, {"purchase": [], "done_p": [], "drawing": [], "done_d": []})
-    all_items = current_check["purchase"] + current_check["drawing"]
-    done_items = set(current_check["done_p"]) | set(current_check["done_d"])
-    real_items = [item for item in all_items if item and str(item).strip()]
-    has_missing = any(str(item).strip() and str(item) not in done_items for item in real_items)
-    all_done = len(real_items) > 0 and not has_missing
-    is_empty = len(real_items) == 0
+    is_empty = row["checklist_items"] == 0
+    has_missing = row["checklist_missing"] > 0
+    all_done = not is_empty and not has_missing
 
     status_tag = ""
     if is_empty:
@@ -112,6 +210,12 @@ def render_project_card(row, idx):
     elif has_missing:
         status_tag = '<span style="background:#ff4444; color:white; padding:4px 12px; border-radius:20px; font-weight:bold; font-size:0.8rem; margin-left:10px;">Missing Submission</span>'
 
+    # 預測會遲交 / 有機會遲交（還沒過 Lead_Time）
+    risk = row.get("risk")
+    if risk in AT_RISK:
+        risk_color = "#ff4444" if risk == "Forecast late" else "#ffaa00"
+        status_tag += f'<span style="background:{risk_color}; color:white; padding:4px 12px; border-radius:20px; font-weight:bold; font-size:0.8rem; margin-left:10px;">{risk}</span>'
+
     reminder_text = str(row.get("Progress_Reminder", "")).strip() or "In Progress"
     reminder_display = f'<div style="position:absolute; top:50%; left:50%; transform:translate(-50%,-50%); font-weight:bold; font-size:0.8rem; color:white; text-shadow:1px 1px 3px black; pointer-events:none; z-index:10;">{reminder_text}</div>'
 
@@ -140,24 +244,36 @@ def render_project_card(row, idx):
 
     with st.expander(f"Details • {row['Project_Name']}", expanded=False):
         st.markdown(f"**Year:** {row['Year']} | **Lead Time:** {fmt(row['Lead_Time'])}")
+        if risk not in (None, "Delivered", "No forecast") and pd.notna(row.get("forecast")):
+            slack = int(row["slack"])
+            st.markdown(f"**Forecast delivery:** {fmt(row['forecast'])} "
+                        f"({abs(slack)} day(s) {'before' if slack >= 0 else 'after'} Lead Time) • {risk}")
         st.markdown(f"**Customer:** {row.get('Customer','—')} | **Supervisor:** {row.get('Supervisor','—')} | **Qty:** {row.get('Qty',0)}")
 
         if row.get("Project_Spec"):
             st.markdown("**Project Specification:**")
-            for line in row["Project_Spec"].split("\n"):
-                if line.strip():
-                    key, val = line.split(": ",1) if ": " in line else ("", line)
-                    st.markdown(f"• **{key}:** {val}")
+            for label, column in SPEC_FIELDS.items():
+                st.markdown(f"• **{label}:** {row[column] or '—'}")
 
         if row.get("Description"):
             st.markdown(f"**Description:** {row['Description']}")
 
+        # 改動記錄：按了才讀（每張卡片都讀會拖慢整頁）
+        if st.button("History", key=f"hist_btn_{pid}", use_container_width=True):
+            st.session_state[f"hist_open_{pid}"] = not st.session_state.get(f"hist_open_{pid}", False)
+        if st.session_state.get(f"hist_open_{pid}", False):
+            history = project_history(backend.read_audit(project_id=pid), pid)
+            if history.empty:
+                st.caption("No recorded changes yet.")
+            else:
+                st.dataframe(history, use_container_width=True, hide_index=True)
+
         # Checklist Panel
-        if st.button("Checklist Panel", key=f"cl_btn_{idx}", use_container_width=True):
-            st.session_state[f"cl_open_{idx}"] = not st.session_state.get(f"cl_open_{idx}", False)
+        if st.button("Checklist Panel", key=f"cl_btn_{pid}", use_container_width=True):
+            st.session_state[f"cl_open_{pid}"] = not st.session_state.get(f"cl_open_{pid}", False)
 
-        if st.session_state.get(f"cl_open_{idx}", False):
-            current = checklist_db.get(project_name, {"purchase": [],"done_p": [],"drawing": [],"done_d": []})
+        if st.session_state.get(f"cl_open_{pid}", False):
+            current = checklists.get(project_name)
 
             st.markdown("<h4 style='text-align:center;'>Purchase List        Drawings Submission</h4>", unsafe_allow_html=True)
 
@@ -175,9 +291,9 @@ def render_project_card(row, idx):
                     checked = text in current["done_p"]
                     col_chk, col_txt = st.columns([1,7])
                     with col_chk:
-                        chk = st.checkbox("", value=checked, key=f"p_{idx}_{i}")
+                        chk = st.checkbox("", value=checked, key=f"p_{pid}_{i}")
                     with col_txt:
-                        txt = st.text_input("", value=text, key=f"pt_{idx}_{i}", label_visibility="collapsed")
+                        txt = st.text_input("", value=text, key=f"pt_{pid}_{i}", label_visibility="collapsed")
                     if txt.strip():
                         new_purchase.append(txt.strip())
                         if chk:
@@ -187,40 +303,334 @@ def render_project_card(row, idx):
                     checked = text in current["done_d"]
                     col_chk, col_txt = st.columns([1,7])
                     with col_chk:
-                        chk = st.checkbox("", value=checked, key=f"d_{idx}_{i}")
+                        chk = st.checkbox("", value=checked, key=f"d_{pid}_{i}")
                     with col_txt:
-                        txt = st.text_input("", value=text, key=f"dt_{idx}_{i}", label_visibility="collapsed")
+                        txt = st.text_input("", value=text, key=f"dt_{pid}_{i}", label_visibility="collapsed")
                     if txt.strip():
                         new_drawing.append(txt.strip())
                         if chk:
                             new_done_d.add(txt.strip())
 
-            if st.button("SAVE CHECKLIST", key=f"save_cl_{idx}", type="primary", use_container_width=True):
-                checklist_db[project_name] = {
+            if st.button("SAVE CHECKLIST", key=f"save_cl_{pid}", type="primary", use_container_width=True):
+                changes = ChangeSet()
+                changes.update(project_name, checklist_record(project_name, {
                     "purchase": new_purchase,
                     "done_p": list(new_done_p),
                     "drawing": new_drawing,
                     "done_d": list(new_done_d)
-                }
-                save_checklist()
-                st.cache_data.clear()
-                st.success("Checklist 已永久儲存到 Google Sheets！")
+                }))
+                save_checklist(changes)
+                st.success(f"Checklist 已永久儲存到 {backend.label}！")
                 st.rerun()
 
+# ==============================================
+# Edit / Delete（每頁共用同一個 Edit 表單）
+# ==============================================
+type_options = ["Enclosure","Open Set","Scania","Marine","K50G3"]
+year_options = [2024, 2025, 2026]
+
+def as_date(v):
+    return pd.to_datetime(v).date() if pd.notna(v) else None
+
+@st.dialog("Edit Project", width="large")
+def edit_dialog(pid, row):
+    st.subheader(f"Editing: {row['Project_Name']}")
+    # 不在選項裡的舊值也要列出來，不然改別的欄位存檔會順便把 Type / Year 改掉
+    types = type_options + [row["Project_Type"]] * (row["Project_Type"] not in type_options)
+    years = sorted(set(year_options) | {int(row["Year"])})
+    with st.form(key="edit_form"):
+        c1, c2 = st.columns(2)
+        with c1:
+            e_type = st.selectbox("Project Type*", types, index=types.index(row["Project_Type"]))
+            e_name = st.text_input("Project Name*", value=row["Project_Name"])
+            e_year = st.selectbox("Year*", years, index=years.index(int(row["Year"])))
+            e_qty = st.number_input("Qty", min_value=1, value=int(row.get("Qty",1)))
+        with c2:
+            e_customer = st.text_input("Customer", value=row.get("Customer",""))
+            e_supervisor = st.text_input("Supervisor", value=row.get("Supervisor",""))
+            e_leadtime = st.date_input("Lead Time*", value=as_date(row["Lead_Time"]) or date.today())
+
+        with st.expander("Project Specification & Progress Dates", expanded=True):
+            e_s1 = st.text_input("Genset model", value=row["Genset_Model"])
+            e_s2 = st.text_input("Alternator Model", value=row["Alternator_Model"])
+            e_s3 = st.text_input("Controller", value=row["Controller"])
+            e_s4 = st.text_input("Circuit breaker Size", value=row["Breaker_Size"])
+            e_s5 = st.text_input("Charger", value=row["Charger"])
+
+            e_desc = st.text_area("Description", value=row.get("Description",""), height=100)
+
+            st.markdown("**Progress Dates**")
+            e_d1 = st.date_input("Parts Arrival", value=as_date(row["Parts_Arrival"]), key="e_d1")
+            e_d2 = st.date_input("Installation Complete", value=as_date(row["Installation_Complete"]), key="e_d2")
+            e_d3 = st.date_input("Testing Complete", value=as_date(row["Testing_Complete"]), key="e_d3")
+            e_d4 = st.date_input("Cleaning Complete", value=as_date(row["Cleaning_Complete"]), key="e_d4")
+            e_d5 = st.date_input("Delivery Complete", value=as_date(row["Delivery_Complete"]), key="e_d5")
+
+            e_reminder = st.text_input("Progress Reminder", value=row.get("Progress_Reminder",""))
+
+        if st.form_submit_button("Save Changes", type="primary"):
+            if not e_name.strip():
+                st.error("Project Name required!")
+            elif e_name != row["Project_Name"] and e_name in df["Project_Name"].values:
+                st.error("Name exists!")
+            else:
+                new_spec = format_spec([e_s1, e_s2, e_s3, e_s4, e_s5])
+                conflicts = update_project(row, {
+                    "Project_Type": e_type, "Project_Name": e_name, "Year": int(e_year),
+                    "Lead_Time": pd.Timestamp(e_leadtime), "Customer": e_customer or "",
+                    "Supervisor": e_supervisor or "", "Qty": e_qty, "Real_Count": e_qty,
+                    "Project_Spec": new_spec, "Description": e_desc or "",
+                    "Progress_Reminder": e_reminder or "",
+                    "Parts_Arrival": pd.Timestamp(e_d1) if e_d1 else pd.NaT,
+                    "Installation_Complete": pd.Timestamp(e_d2) if e_d2 else pd.NaT,
+                    "Testing_Complete": pd.Timestamp(e_d3) if e_d3 else pd.NaT,
+                    "Cleaning_Complete": pd.Timestamp(e_d4) if e_d4 else pd.NaT,
+                    "Delivery_Complete": pd.Timestamp(e_d5) if e_d5 else pd.NaT
+                })
+                if conflicts:
+                    st.error("Some changes were not saved:\n\n" + "\n\n".join(map(conflict_text, conflicts)))
+                else:
+                    st.success("Updated!")
+                    st.rerun()
+
+def render_card_actions(row, pid):
+    # Edit 和 Delete 平排（縮小按鈕）
+    btn_col1, btn_col2 = st.columns(2)
+    with btn_col1:
+        if st.button("Edit", key=f"edit_{pid}"):
+            st.session_state.edit_target = pid
+    with btn_col2:
+        if st.button("Delete", key=f"del_{pid}", type="secondary"):
+            st.session_state[f"confirm_delete_{pid}"] = True
+
+    # Delete 確認
+    if st.session_state.get(f"confirm_delete_{pid}", False):
+        st.warning(f"確定要刪除專案 **{row['Project_Name']}** 嗎？")
+        col_yes, col_no = st.columns(2)
+        if col_yes.button("Yes, Delete", type="primary", key=f"del_yes_{pid}"):
+            conflicts = delete_project(row)
+            st.session_state.pop(f"confirm_delete_{pid}", None)
+            if conflicts:
+                st.error("\n\n".join(map(conflict_text, conflicts)))
+            else:
+                st.success("已刪除！")
+                st.rerun()
+        if col_no.button("Cancel", key=f"del_no_{pid}"):
+            st.session_state.pop(f"confirm_delete_{pid}", None)
+            st.rerun()
+
+# ==============================================
+# 分頁（只建立目前這一頁的卡片）
+# ==============================================
+sort_options = {"Sheet Order": None, "Lead Time": "Lead_Time", "Project Name": "Project_Name",
+                "Progress": "progress", "Customer": "Customer", "Forecast Slack": "slack"}
+
+def turn_page(step):
+    st.session_state.card_page = st.session_state.get("card_page", 0) + step
+
+def page_nav(page, n_pages, total, where):
+    nav1, nav2, nav3 = st.columns([1, 3, 1])
+    nav1.button("◀ Prev", key=f"page_prev_{where}", disabled=page <= 0,
+                on_click=turn_page, args=(-1,), use_container_width=True)
+    first = page * page_size + 1
+    last = min((page + 1) * page_size, total)
+    nav2.markdown(f"<div style='text-align:center; padding-top:6px;'>Page {page + 1} / {n_pages} • {first}–{last} of {total}</div>",
+                  unsafe_allow_html=True)
+    nav3.button("Next ▶", key=f"page_next_{where}", disabled=page >= n_pages - 1,
+                on_click=turn_page, args=(1,), use_container_width=True)
+
+# ==============================================
+# 即時更新（別人存檔後只更新受影響的卡片）
+# ==============================================
+def live_update():
+    """feed 有新改動：只改了卡片上的欄位就只更新那幾張卡片；
+    新增 / 刪除，或改了篩選、排序、計數會用到的欄位，就整頁重跑。"""
+    global snap, checklists
+    seen = st.session_state.get("feed_seq", feed.seq)
+    seq = feed.poll()
+    if seq == seen:
+        return
+    t = Profiler()
+    with t.span("live_patch"):
+        # 新版本的 snapshot 也是共用的：第一個看到改動的 session 建好，其他直接拿
+        fresh = snapshots.get(today, seq)
+        # 依 Progress / 預測排序，或在 Delay / At-risk 頁時，進度日期改了排序 / 篩選結果也會變
+        dates_move = sort_options[sort_by] in ("progress", "slack") or st.session_state.view_mode in ("delay", "risk")
+        card_fields = [f for f in CARD_FIELDS if not dates_move or f not in DATE_COLUMNS]
+        # 有搜尋字串時，描述 / 提醒 / checklist 改了搜尋結果也會變
+        if spec_search:
+            card_fields = [f for f in card_fields if f not in TEXT_COLUMNS]
+        ids, card_only = changed_projects(snap.df, fresh.df, card_fields)
+        if card_only and ids:
+            # 進度（由里程碑日期算出）變了：Delay 頁的篩選也會變，整頁重跑
+            before = snap.all_df.set_index("Project_ID")["progress"].reindex(ids)
+            after = fresh.all_df.set_index("Project_ID")["progress"].reindex(ids)
+            card_only = bool(before.eq(after).all())
+        names = changed_checklists(snap.checklists, fresh.checklists)
+        if not card_only or (spec_search and names):
+            st.rerun(scope="app")
+        rows = fresh.all_df[fresh.all_df["Project_ID"].isin(ids) | fresh.all_df["Project_Name"].isin(names)]
+        st.session_state.live_patches.update({r["Project_ID"]: r for r in rows.to_dict("records")})
+        # 這個 session 的卡片位置還是舊 snapshot 的，只換掉之後比較 / Checklist Panel 用的那份
+        snap, checklists = fresh, fresh.checklists
+        st.session_state.feed_seq = seq
+    profile_log.add(t.record("live", changed=len(rows)))
+
+# 卡片區是 fragment：每 live_every 秒自己重跑一次（只檢查 feed，不讀資料），
+# 翻頁 / 開 Checklist 也只重跑這一區
+@st.fragment(run_every=live_every or None)
+def card_grid(positions):
+    if live_every:
+        live_update()
+    patches = st.session_state.get("live_patches", {})
+
+    # 只保留 row 位置，這一頁的卡片才從共用的 all_df 取出來
+    n_pages = (len(positions) - 1) // page_size + 1
+    page = min(max(st.session_state.get("card_page", 0), 0), n_pages - 1)
+    st.session_state.card_page = page
+    page_df = all_df.iloc[positions[page * page_size:(page + 1) * page_size]]
+
+    if n_pages > 1:
+        page_nav(page, n_pages, len(positions), "top")
+
+    # 一行顯示 2 個專案卡片（只有輕量卡片，Edit 表單用 dialog 另外開）
+    rows = [patches.get(r["Project_ID"], r) for r in page_df.to_dict('records')]
+    for i in range(0, len(rows), 2):
+        for col, j in zip(st.columns(2), (i, i + 1)):
+            if j < len(rows):
+                with col:
+                    render_project_card(rows[j], rows[j]["Project_ID"])
+                    render_card_actions(rows[j], rows[j]["Project_ID"])
+
+    # 整頁最多只有一個 Edit 表單
+    if "edit_target" in st.session_state:
+        edit_id = st.session_state.pop("edit_target")
+        target = [r for r in rows if r["Project_ID"] == edit_id]
+        if target:
+            edit_dialog(edit_id, project_record(target[0]))
+
+    if n_pages > 1:
+        page_nav(page, n_pages, len(positions), "bottom")
+
+# ==============================================
+# 時間線（篩選後的所有專案畫成一個 chart，不用逐張卡片）
+# ==============================================
+def render_timeline(positions):
+    with profiler.span("timeline"):
+        chart = snap.timeline.chart(positions)
+    event = st.altair_chart(chart, on_select="rerun", selection_mode="pick", key="timeline_chart",
+                            use_container_width=True)
+    st.caption("Bars: stages between milestones • dots: milestones • red: Lead Time. "
+               "Drag to pan, scroll to zoom, click a bar to open the project.")
+    picked = event.selection.get("pick", []) if event else []
+    if not picked:
+        return
+    pid = picked[0].get("Project_ID")
+    hit = np.flatnonzero(all_df["Project_ID"].to_numpy()[positions] == pid)
+    if len(hit) == 0:
+        return
+    row = st.session_state.get("live_patches", {}).get(pid) or all_df.iloc[positions[hit[0]]].to_dict()
+    render_project_card(row, pid)
+    render_card_actions(row, pid)
+    if st.session_state.get("edit_target") == pid:
+        st.session_state.pop("edit_target")
+        edit_dialog(pid, project_record(row))
+
+# ==============================================
+# 統計頁（snapshot 裡預先加總好的 rollup，不用每次 groupby 全部專案）
+# ==============================================
+def render_analytics(rollups, year):
+    schedule = rollups.schedule(year)
+    total = schedule.loc["All"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Projects", int(total["projects"]))
+    m2.metric("Delivered on time", int(total["on_time"]))
+    m3.metric("Delivered late", int(total["late"]),
+              help=f"{total['avg_days_late']} days late on average" if total["late"] else None)
+    m4.metric("Overdue, not delivered", int(total["overdue"]))
+
+    st.subheader("Units delivered per month")
+    delivered = rollups.delivered_by_month(year)
+    if delivered.empty:
+        st.info("No deliveries yet.")
+    else:
+        st.bar_chart(delivered)
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("On time vs late")
+        st.bar_chart(schedule.drop(index="All")[["on_time", "late", "overdue"]]
+                     .rename(columns={"on_time": "On time", "late": "Late", "overdue": "Overdue"}))
+        st.dataframe(schedule.rename(columns={"projects": "Projects", "on_time": "On time", "late": "Late",
+                                              "overdue": "Overdue", "open": "Not delivered",
+                                              "avg_days_late": "Avg days late"}),
+                     use_container_width=True)
+    with c2:
+        st.subheader("Average days per stage")
+        st.caption("Days from the previous milestone, completed stages only")
+        st.dataframe(rollups.stage_days(year), use_container_width=True)
+
+    st.subheader("Supervisor load")
+    load = rollups.supervisor_load(year)
+    st.bar_chart(load["open_qty"].rename("Units not delivered"))
+    st.dataframe(load.rename(columns={"projects": "Projects", "qty": "Units", "open": "Not delivered",
+                                      "open_qty": "Units not delivered", "overdue": "Overdue"}),
+                 use_container_width=True)
+
 # ==============================================
 # 左側側邊欄
 # ==============================================
 with st.sidebar:
     st.header("View Controls")
+    st.text_input("Your name", key="audit_user", placeholder="Shown in project history",
+                  help="Saved with your changes in each project's History")
 
     if st.button("All Projects", use_container_width=True, type="primary", key="btn_all"):
         st.session_state.view_mode = "all"
     if st.button("Delay Projects", use_container_width=True, type="secondary", key="btn_delay"):
         st.session_state.view_mode = "delay"
+    if st.button("At-risk Projects", use_container_width=True, type="secondary", key="btn_risk"):
+        st.session_state.view_mode = "risk"
+    if st.button("Analytics", use_container_width=True, type="secondary", key="btn_analytics"):
+        st.session_state.view_mode = "analytics"
 
     if "view_mode" not in st.session_state:
         st.session_state.view_mode = "all"
 
+    if st.button(f"Reload from {backend.label}", use_container_width=True, key="btn_reload"):
+        backend.refresh()
+        st.rerun()
+    versions = backend.versions()
+    st.caption(f"Data version: projects v{versions['projects']} • checklist v{versions['checklist']}")
+
+    if cache is not None and cache.offline:
+        saved = cache.saved_at()
+        saved = datetime.fromtimestamp(saved).strftime("%Y-%m-%d %H:%M") if saved else "start-up"
+        waiting = backend.status()["pending"] if isinstance(backend, WriteBehindBackend) else 0
+        st.warning(f"Offline — showing data saved at {saved}"
+                   + (f", {waiting} change(s) waiting to sync" if waiting else ""))
+
+    if isinstance(backend, WriteBehindBackend):
+        sync = backend.status()
+        if sync["failed"]:
+            st.error(f"{sync['failed']} change(s) failed to sync: {sync['last_error']}")
+            if st.button("Retry sync", use_container_width=True, key="btn_retry_sync"):
+                backend.retry_failed()
+                st.rerun()
+        elif sync["pending"] and sync["offline"]:
+            st.caption(f"{sync['pending']} change(s) will sync when {backend.label} is reachable")
+        elif sync["pending"]:
+            st.warning(f"Syncing {sync['pending']} change(s) to {backend.label}…"
+                       + (f" (retrying: {sync['last_error']})" if sync["last_error"] else ""))
+        else:
+            st.caption(f"All changes saved to {backend.label}")
+        if sync["conflicts"]:
+            st.error("Edit conflicts — these changes were not saved:\n\n"
+                     + "\n\n".join(map(conflict_text, sync["conflicts"])))
+            if st.button("Dismiss", use_container_width=True, key="btn_dismiss_conflicts"):
+                backend.dismiss_conflicts()
+                st.rerun()
+
     st.markdown("---")
 
     project_types = ["All", "Enclosure", "Open Set", "Scania", "Marine", "K50G3"]
@@ -232,10 +642,33 @@ with st.sidebar:
         selected_type = st.selectbox("Project Type", project_types, index=0, key="filter_type")
         selected_year = st.selectbox("Year", years, index=1, key="filter_year")
         selected_month = st.selectbox("Month", month_names, index=0, key="filter_month")
+        selected_customer = st.selectbox("Customer", ["All"] + project_query.options("customer"), key="filter_customer")
+        selected_supervisor = st.selectbox("Supervisor", ["All"] + project_query.options("supervisor"), key="filter_supervisor")
+        spec_search = st.text_input("Search", placeholder="e.g. DSE7320, Stamford, 報價, GA drawing",
+                                    help="Specification, description, reminder, customer and checklist items",
+                                    key="filter_spec").strip()
+        missing_only = st.checkbox("Only items not yet submitted", key="filter_missing",
+                                   help="Match checklist items that are still missing (e.g. a drawing)")
     else:
         selected_type = "All"
         selected_year = date.today().year
         selected_month = "All"
+        selected_customer = "All"
+        selected_supervisor = "All"
+        spec_search = ""
+        missing_only = False
+        if st.session_state.view_mode == "analytics":
+            st.markdown("### Filters")
+            analytics_year = st.selectbox("Year", ["All"] + years, index=0, key="analytics_year")
+
+    st.markdown("### Display")
+    sort_by = st.selectbox("Sort by", list(sort_options), index=0, key="sort_by")
+    sort_desc = st.checkbox("Descending", value=False, key="sort_desc")
+    layout = st.radio("Show as", ["Cards", "Timeline"], horizontal=True, key="layout")
+    page_sizes = [10, 20, 50, 100]
+    default_size = int(setting("page_size", 20))
+    page_size = st.selectbox("Cards per page", page_sizes,
+                             index=page_sizes.index(default_size) if default_size in page_sizes else 1, key="page_size")
 
     st.markdown("---")
 
@@ -244,9 +677,9 @@ with st.sidebar:
     with st.form("add_form", clear_on_submit=True):
         c1, c2 = st.columns(2)
         with c1:
-            new_type = st.selectbox("Project Type*", ["Enclosure","Open Set","Scania","Marine","K50G3"], key="new_type")
+            new_type = st.selectbox("Project Type*", type_options, key="new_type")
             new_name = st.text_input("Project Name*", key="new_name")
-            new_year = st.selectbox("Year*", [2024,2025,2026], index=1, key="new_year")
+            new_year = st.selectbox("Year*", year_options, index=1, key="new_year")
             new_qty = st.number_input("Qty", min_value=1, value=1, key="new_qty")
         with c2:
             new_customer = st.text_input("Customer", key="new_customer")
@@ -275,287 +708,155 @@ with st.sidebar:
             elif new_name in df["Project_Name"].values:
                 st.error("Name exists!")
             else:
-                spec_lines = [f"Genset model: {s1 or '—'}", f"Alternator Model: {s2 or '—'}",
-                              f"Controller: {s3 or '—'}", f"Circuit breaker Size: {s4 or '—'}", f"Charger: {s5 or '—'}"]
-                spec_text = "\n".join(spec_lines)
+                spec_text = format_spec([s1, s2, s3, s4, s5])
 
                 new_project = {
                     "Project_Type": new_type, "Project_Name": new_name, "Year": int(new_year),
                     "Lead_Time": new_leadtime, "Customer": new_customer or "", "Supervisor": new_supervisor or "",
                     "Qty": new_qty, "Real_Count": new_qty, "Project_Spec": spec_text, "Description": desc or "",
                     "Progress_Reminder": reminder or "", "Parts_Arrival": d1, "Installation_Complete": d2,
-                    "Testing_Complete": d3, "Cleaning_Complete": d4, "Delivery_Complete": d5
+                    "Testing_Complete": d3, "Cleaning_Complete": d4, "Delivery_Complete": d5,
+                    "Project_ID": new_project_id()
                 }
-                df = pd.concat([df, pd.DataFrame([new_project])], ignore_index=True)
-                save_projects()
-                st.cache_data.clear()
+                changes = ChangeSet()
+                changes.add(new_project["Project_ID"], new_project)
+                save_projects(changes)
                 st.success(f"Added: {new_name}")
                 st.rerun()
 
 # ==============================================
 # 篩選邏輯
 # ==============================================
-today = date.today()
-all_df = df.copy()
-
-if st.session_state.view_mode == "delay":
-    filtered_df = all_df[
-        all_df["Lead_Time"].notna() &
-        (all_df["Lead_Time"] < pd.Timestamp(today)) &
-        (all_df.apply(calculate_progress, axis=1) < 100)
-    ].copy()
-    page_title = "Delay Projects"
-else:
-    filtered_df = all_df.copy()
-    if selected_type != "All":
-        filtered_df = filtered_df[filtered_df["Project_Type"] == selected_type]
-    filtered_df = filtered_df[filtered_df["Year"] == selected_year]
-    if selected_month != "All":
-        month_map = {"Jan":1,"Feb":2,"Mar":3,"Apr":4,"May":5,"Jun":6,"Jul":7,"Aug":8,"Sep":9,"Oct":10,"Nov":11,"Dec":12}
-        filtered_df = filtered_df[
-            filtered_df["Lead_Time"].notna() &
-            (filtered_df["Lead_Time"].dt.month == month_map[selected_month])
-        ]
-    page_title = "YIP SHING Project Dashboard"
+with profiler.span("filter"):
+    if st.session_state.view_mode == "delay":
+        positions = project_query.overdue(today)
+        page_title = "Delay Projects"
+    elif st.session_state.view_mode == "risk":
+        positions = project_query.at_risk(AT_RISK)
+        page_title = "At-risk Projects"
+    elif st.session_state.view_mode == "analytics":
+        positions = project_query.select(year=None if analytics_year == "All" else analytics_year)
+        page_title = "Analytics"
+    else:
+        positions = project_query.select(
+            year=selected_year,
+            project_type=None if selected_type == "All" else selected_type,
+            month=None if selected_month == "All" else month_names.index(selected_month),
+            customer=None if selected_customer == "All" else selected_customer,
+            supervisor=None if selected_supervisor == "All" else selected_supervisor,
+            text=spec_search or None,
+            missing_only=missing_only)
+        page_title = "YIP SHING Project Dashboard"
 
 # ==============================================
 # 主畫面
 # ==============================================
-st.title(page_title)
+with profiler.span("render"):
+    st.title(page_title)
+
+    if len(positions) > 0:
+        # 只取計數要用的欄位，不複製整份篩選結果
+        counts = all_df[["Project_Type", "Qty"]].iloc[positions]
+        counter = counts.groupby("Project_Type", observed=True)["Qty"].sum().astype(int).sort_index()
+        total_qty = int(counts["Qty"].sum())
+        st.markdown(f"""
+        <div style="position:fixed; top:70px; right:20px; background:#1e3a8a; color:white; padding:12px 18px; 
+                    border-radius:12px; box-shadow:0 4px 15px rgba(0,0,0,0.3); z-index:1000; font-size:0.9rem; text-align:center;">
+            <strong style="font-size:1.1rem;">Total: {total_qty}</strong><br>
+            {"<br>".join([f"<strong>{k}:</strong> {v}" for k, v in counter.items()])}
+        </div>
+        """, unsafe_allow_html=True)
+
+    if st.session_state.view_mode == "analytics":
+        render_analytics(snap.rollups, None if analytics_year == "All" else analytics_year)
+    elif len(positions) == 0:
+        if st.session_state.view_mode == "delay":
+            st.success("No delay projects! All on time!")
+        elif st.session_state.view_mode == "risk":
+            st.success("No projects at risk of missing their Lead Time.")
+        else:
+            st.info("No projects match the selected filters.")
+    else:
+        if sort_options[sort_by]:
+            # 只排序位置（排序欄位取一欄出來），不搬動整份資料
+            keys = all_df[sort_options[sort_by]].iloc[positions].reset_index(drop=True)
+            order = keys.sort_values(ascending=not sort_desc, na_position="last", kind="stable").index
+            positions = positions[order.to_numpy()]
+        elif sort_desc:
+            positions = positions[::-1]
+
+        # 篩選 / 排序 / 每頁數量改變時回到第一頁
+        page_sig = (st.session_state.view_mode, selected_type, selected_year, selected_month,
+                    selected_customer, selected_supervisor, spec_search, missing_only, sort_by, sort_desc, page_size)
+        if st.session_state.get("card_page_sig") != page_sig:
+            st.session_state.card_page_sig = page_sig
+            st.session_state.card_page = 0
+        if layout == "Timeline":
+            render_timeline(positions)
+        else:
+            card_grid(positions)
 
-if len(filtered_df) > 0:
-    counter = filtered_df.groupby("Project_Type")["Qty"].sum().astype(int).sort_index()
-    total_qty = int(filtered_df["Qty"].sum())
-    st.markdown(f"""
-    <div style="position:fixed; top:70px; right:20px; background:#1e3a8a; color:white; padding:12px 18px; 
-                border-radius:12px; box-shadow:0 4px 15px rgba(0,0,0,0.3); z-index:1000; font-size:0.9rem; text-align:center;">
-        <strong style="font-size:1.1rem;">Total: {total_qty}</strong><br>
-        {"<br>".join([f"<strong>{k}:</strong> {v}" for k, v in counter.items()])}
-    </div>
-    """, unsafe_allow_html=True)
+# ==============================================
+# 大量匯入 / 匯出（側邊欄）
+# ==============================================
+with st.sidebar:
+    st.markdown("---")
+    st.header("Import / Export")
+    if "import_message" in st.session_state:
+        st.success(st.session_state.pop("import_message"))
+
+    upload = st.file_uploader("Import projects", type=IMPORT_TYPES, key="import_file",
+                              help="CSV / Excel / Parquet with the same columns as an export. "
+                                   "Names that already exist are skipped.")
+    if upload is not None and st.button("Import", use_container_width=True, type="primary", key="btn_import"):
+        try:
+            with st.spinner(f"Reading {upload.name}…"), profiler.span("import"):
+                result = import_projects(upload, upload.name, editable, type_options, year_options,
+                                         existing_names=df["Project_Name"])
+        except Exception as exc:
+            st.error(f"Import failed: {exc}")
+        else:
+            if result.invalid:
+                st.error(f"{result.summary()} — nothing was imported. Fix these rows and try again:\n\n"
+                         + "\n\n".join(result.errors))
+            elif not result.changes:
+                st.info(result.summary())
+            else:
+                # 整個檔案一次存檔（Google Sheets 一次 append_rows / SQLite 一個交易）
+                save_projects(result.changes)
+                st.session_state.import_message = f"Imported {result.summary()}"
+                st.rerun()
 
-if len(filtered_df) == 0:
-    if st.session_state.view_mode == "delay":
-        st.success("No delay projects! All on time!")
+    export_scope = st.radio("Export", ["Current view", "All projects", "As of date"], horizontal=True,
+                            key="export_scope")
+    export_format = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+    ext, mime = EXPORT_FORMATS[export_format]
+    # 按下 Download 才產生檔案（一次一塊寫進暫存檔），不經過卡片畫面
+    if export_scope == "As of date":
+        as_of_date = st.date_input("As of (end of day)", value=today, max_value=today, key="export_as_of")
+        st.download_button("Download", partial(export_as_of, as_of_date, ext),
+                           file_name=f"projects_{as_of_date:%Y-%m-%d}.{ext}", mime=mime,
+                           use_container_width=True, key="btn_export")
     else:
-        st.info("No projects match the selected filters.")
-else:
-    # 一行顯示 2 個專案卡片
-    rows = filtered_df.to_dict('records')
-    for i in range(0, len(rows), 2):
-        col1, col2 = st.columns(2)
-
-        # 左邊卡片
-        with col1:
-            if i < len(rows):
-                row = rows[i]
-                idx = filtered_df.index[i]
-                render_project_card(row, idx)
-
-                # Edit 和 Delete 平排（縮小按鈕）
-                btn_col1, btn_col2 = st.columns(2)
-                with btn_col1:
-                    if st.button("Edit", key=f"edit_{idx}"):
-                        st.session_state[f"editing_{idx}"] = not st.session_state.get(f"editing_{idx}", False)
-
-                with btn_col2:
-                    if st.button("Delete", key=f"del_{idx}", type="secondary"):
-                        st.session_state[f"confirm_delete_{idx}"] = True
-
-                # Edit 表單
-                if st.session_state.get(f"editing_{idx}", False):
-                    st.markdown("---")
-                    st.subheader(f"Editing: {row['Project_Name']}")
-                    with st.form(key=f"edit_form_{idx}"):
-                        c1, c2 = st.columns(2)
-                        with c1:
-                            e_type = st.selectbox("Project Type*", ["Enclosure","Open Set","Scania","Marine","K50G3"],
-                                                  index=["Enclosure","Open Set","Scania","Marine","K50G3"].index(row["Project_Type"]))
-                            e_name = st.text_input("Project Name*", value=row["Project_Name"])
-                            e_year = st.selectbox("Year*", [2024,2025,2026], index=[2024,2025,2026].index(row["Year"]))
-                            e_qty = st.number_input("Qty", min_value=1, value=int(row.get("Qty",1)))
-                        with c2:
-                            e_customer = st.text_input("Customer", value=row.get("Customer",""))
-                            e_supervisor = st.text_input("Supervisor", value=row.get("Supervisor",""))
-                            e_leadtime = st.date_input("Lead Time*", value=pd.to_datetime(row["Lead_Time"]).date() if pd.notna(row["Lead_Time"]) else date.today())
-
-                        with st.expander("Project Specification & Progress Dates", expanded=True):
-                            curr_spec = row.get("Project_Spec","")
-                            lines = [line.split(": ",1)[1] if ": " in line else "" for line in curr_spec.split("\n")] if curr_spec else ["","","","",""]
-                            e_s1 = st.text_input("Genset model", value=lines[0] if len(lines)>0 else "")
-                            e_s2 = st.text_input("Alternator Model", value=lines[1] if len(lines)>1 else "")
-                            e_s3 = st.text_input("Controller", value=lines[2] if len(lines)>2 else "")
-                            e_s4 = st.text_input("Circuit breaker Size", value=lines[3] if len(lines)>3 else "")
-                            e_s5 = st.text_input("Charger", value=lines[4] if len(lines)>4 else "")
-
-                            e_desc = st.text_area("Description", value=row.get("Description",""), height=100)
-
-                            st.markdown("**Progress Dates**")
-                            e_d1 = st.date_input("Parts Arrival", value=pd.to_datetime(row["Parts_Arrival"]).date() if pd.notna(row["Parts_Arrival"]) else None, key=f"d1e{idx}")
-                            e_d2 = st.date_input("Installation Complete", value=pd.to_datetime(row["Installation_Complete"]).date() if pd.notna(row["Installation_Complete"]) else None, key=f"d2e{idx}")
-                            e_d3 = st.date_input("Testing Complete", value=pd.to_datetime(row["Testing_Complete"]).date() if pd.notna(row["Testing_Complete"]) else None, key=f"d3e{idx}")
-                            e_d4 = st.date_input("Cleaning Complete", value=pd.to_datetime(row["Cleaning_Complete"]).date() if pd.notna(row["Cleaning_Complete"]) else None, key=f"d4e{idx}")
-                            e_d5 = st.date_input("Delivery Complete", value=pd.to_datetime(row["Delivery_Complete"]).date() if pd.notna(row["Delivery_Complete"]) else None, key=f"d5e{idx}")
-
-                            e_reminder = st.text_input("Progress Reminder", value=row.get("Progress_Reminder",""))
-
-                        if st.form_submit_button("Save Changes", type="primary"):
-                            if not e_name.strip():
-                                st.error("Project Name required!")
-                            else:
-                                new_spec = "\n".join([
-                                    f"Genset model: {e_s1 or '—'}",
-                                    f"Alternator Model: {e_s2 or '—'}",
-                                    f"Controller: {e_s3 or '—'}",
-                                    f"Circuit breaker Size: {e_s4 or '—'}",
-                                    f"Charger: {e_s5 or '—'}"
-                                ])
-                                df.at[idx, "Project_Type"] = e_type
-                                df.at[idx, "Project_Name"] = e_name
-                                df.at[idx, "Year"] = int(e_year)
-                                df.at[idx, "Lead_Time"] = e_leadtime
-                                df.at[idx, "Customer"] = e_customer or ""
-                                df.at[idx, "Supervisor"] = e_supervisor or ""
-                                df.at[idx, "Qty"] = e_qty
-                                df.at[idx, "Real_Count"] = e_qty
-                                df.at[idx, "Project_Spec"] = new_spec
-                                df.at[idx, "Description"] = e_desc or ""
-                                df.at[idx, "Progress_Reminder"] = e_reminder or ""
-                                df.at[idx, "Parts_Arrival"] = e_d1
-                                df.at[idx, "Installation_Complete"] = e_d2
-                                df.at[idx, "Testing_Complete"] = e_d3
-                                df.at[idx, "Cleaning_Complete"] = e_d4
-                                df.at[idx, "Delivery_Complete"] = e_d5
-                                save_projects()
-                                st.cache_data.clear()
-                                del st.session_state[f"editing_{idx}"]
-                                st.success("Updated!")
-                                st.rerun()
-
-                # Delete 確認
-                if st.session_state.get(f"confirm_delete_{idx}", False):
-                    st.warning(f"確定要刪除專案 **{row['Project_Name']}** 嗎？")
-                    col_yes, col_no = st.columns(2)
-                    if col_yes.button("Yes, Delete", type="primary"):
-                        df = df.drop(idx).reset_index(drop=True)
-                        save_projects()
-                        checklist_db.pop(row["Project_Name"], None)
-                        save_checklist()
-                        st.cache_data.clear()
-                        if f"confirm_delete_{idx}" in st.session_state:
-                            del st.session_state[f"confirm_delete_{idx}"]
-                        st.success("已刪除！")
-                        st.rerun()
-                    if col_no.button("Cancel"):
-                        if f"confirm_delete_{idx}" in st.session_state:
-                            del st.session_state[f"confirm_delete_{idx}"]
-                        st.rerun()
-
-        # 右邊卡片
-        with col2:
-            if i + 1 < len(rows):
-                row = rows[i + 1]
-                idx = filtered_df.index[i + 1]
-                render_project_card(row, idx)
-
-                # Edit 和 Delete 平排（右邊）
-                btn_col1, btn_col2 = st.columns(2)
-                with btn_col1:
-                    if st.button("Edit", key=f"edit_{idx}"):
-                        st.session_state[f"editing_{idx}"] = not st.session_state.get(f"editing_{idx}", False)
-
-                with btn_col2:
-                    if st.button("Delete", key=f"del_{idx}", type="secondary"):
-                        st.session_state[f"confirm_delete_{idx}"] = True
-
-                # Edit 表單（右邊）
-                if st.session_state.get(f"editing_{idx}", False):
-                    st.markdown("---")
-                    st.subheader(f"Editing: {row['Project_Name']}")
-                    with st.form(key=f"edit_form_{idx}"):
-                        c1, c2 = st.columns(2)
-                        with c1:
-                            e_type = st.selectbox("Project Type*", ["Enclosure","Open Set","Scania","Marine","K50G3"],
-                                                  index=["Enclosure","Open Set","Scania","Marine","K50G3"].index(row["Project_Type"]))
-                            e_name = st.text_input("Project Name*", value=row["Project_Name"])
-                            e_year = st.selectbox("Year*", [2024,2025,2026], index=[2024,2025,2026].index(row["Year"]))
-                            e_qty = st.number_input("Qty", min_value=1, value=int(row.get("Qty",1)))
-                        with c2:
-                            e_customer = st.text_input("Customer", value=row.get("Customer",""))
-                            e_supervisor = st.text_input("Supervisor", value=row.get("Supervisor",""))
-                            e_leadtime = st.date_input("Lead Time*", value=pd.to_datetime(row["Lead_Time"]).date() if pd.notna(row["Lead_Time"]) else date.today())
-
-                        with st.expander("Project Specification & Progress Dates", expanded=True):
-                            curr_spec = row.get("Project_Spec","")
-                            lines = [line.split(": ",1)[1] if ": " in line else "" for line in curr_spec.split("\n")] if curr_spec else ["","","","",""]
-                            e_s1 = st.text_input("Genset model", value=lines[0] if len(lines)>0 else "")
-                            e_s2 = st.text_input("Alternator Model", value=lines[1] if len(lines)>1 else "")
-                            e_s3 = st.text_input("Controller", value=lines[2] if len(lines)>2 else "")
-                            e_s4 = st.text_input("Circuit breaker Size", value=lines[3] if len(lines)>3 else "")
-                            e_s5 = st.text_input("Charger", value=lines[4] if len(lines)>4 else "")
-
-                            e_desc = st.text_area("Description", value=row.get("Description",""), height=100)
-
-                            st.markdown("**Progress Dates**")
-                            e_d1 = st.date_input("Parts Arrival", value=pd.to_datetime(row["Parts_Arrival"]).date() if pd.notna(row["Parts_Arrival"]) else None, key=f"d1e{idx}")
-                            e_d2 = st.date_input("Installation Complete", value=pd.to_datetime(row["Installation_Complete"]).date() if pd.notna(row["Installation_Complete"]) else None, key=f"d2e{idx}")
-                            e_d3 = st.date_input("Testing Complete", value=pd.to_datetime(row["Testing_Complete"]).date() if pd.notna(row["Testing_Complete"]) else None, key=f"d3e{idx}")
-                            e_d4 = st.date_input("Cleaning Complete", value=pd.to_datetime(row["Cleaning_Complete"]).date() if pd.notna(row["Cleaning_Complete"]) else None, key=f"d4e{idx}")
-                            e_d5 = st.date_input("Delivery Complete", value=pd.to_datetime(row["Delivery_Complete"]).date() if pd.notna(row["Delivery_Complete"]) else None, key=f"d5e{idx}")
-
-                            e_reminder = st.text_input("Progress Reminder", value=row.get("Progress_Reminder",""))
-
-                        if st.form_submit_button("Save Changes", type="primary"):
-                            if not e_name.strip():
-                                st.error("Project Name required!")
-                            else:
-                                new_spec = "\n".join([
-                                    f"Genset model: {e_s1 or '—'}",
-                                    f"Alternator Model: {e_s2 or '—'}",
-                                    f"Controller: {e_s3 or '—'}",
-                                    f"Circuit breaker Size: {e_s4 or '—'}",
-                                    f"Charger: {e_s5 or '—'}"
-                                ])
-                                df.at[idx, "Project_Type"] = e_type
-                                df.at[idx, "Project_Name"] = e_name
-                                df.at[idx, "Year"] = int(e_year)
-                                df.at[idx, "Lead_Time"] = e_leadtime
-                                df.at[idx, "Customer"] = e_customer or ""
-                                df.at[idx, "Supervisor"] = e_supervisor or ""
-                                df.at[idx, "Qty"] = e_qty
-                                df.at[idx, "Real_Count"] = e_qty
-                                df.at[idx, "Project_Spec"] = new_spec
-                                df.at[idx, "Description"] = e_desc or ""
-                                df.at[idx, "Progress_Reminder"] = e_reminder or ""
-                                df.at[idx, "Parts_Arrival"] = e_d1
-                                df.at[idx, "Installation_Complete"] = e_d2
-                                df.at[idx, "Testing_Complete"] = e_d3
-                                df.at[idx, "Cleaning_Complete"] = e_d4
-                                df.at[idx, "Delivery_Complete"] = e_d5
-                                save_projects()
-                                st.cache_data.clear()
-                                del st.session_state[f"editing_{idx}"]
-                                st.success("Updated!")
-                                st.rerun()
-
-                # Delete 確認（右邊）
-                if st.session_state.get(f"confirm_delete_{idx}", False):
-                    st.warning(f"確定要刪除專案 **{row['Project_Name']}** 嗎？")
-                    col_yes, col_no = st.columns(2)
-                    if col_yes.button("Yes, Delete", type="primary"):
-                        df = df.drop(idx).reset_index(drop=True)
-                        save_projects()
-                        checklist_db.pop(row["Project_Name"], None)
-                        save_checklist()
-                        st.cache_data.clear()
-                        if f"confirm_delete_{idx}" in st.session_state:
-                            del st.session_state[f"confirm_delete_{idx}"]
-                        st.success("已刪除！")
-                        st.rerun()
-                    if col_no.button("Cancel"):
-                        if f"confirm_delete_{idx}" in st.session_state:
-                            del st.session_state[f"confirm_delete_{idx}"]
-                        st.rerun()
+        st.download_button("Download", partial(export_projects, all_df, ext,
+                                               positions if export_scope == "Current view" else None),
+                           file_name=f"projects.{ext}", mime=mime, use_container_width=True, key="btn_export")
 
 st.markdown("---")
-st.caption("All data permanently stored in Google Sheets • Immediate update after add/edit/delete")
\ No newline at end of file
+st.caption(f"All data permanently stored in {backend.label} • Immediate update after add/edit/delete")
+
+# ==============================================
+# 效能面板（[dashboard] debug_panel = true 或網址加 ?debug=1）
+# ==============================================
+profile_log.add(profiler.record(st.session_state.view_mode, rows=len(df), shown=len(positions)))
+
+if setting("debug_panel", False) or st.query_params.get("debug") == "1":
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("Performance", expanded=False):
+            st.markdown("**This rerun (ms)**")
+            st.dataframe(pd.Series(profiler.spans, name="ms").round(1), use_container_width=True)
+            st.markdown("**p50 / p95 by view (ms)**")
+            st.dataframe(profile_log.summary(), use_container_width=True)
+            st.download_button("Export JSON lines", profile_log.to_jsonl(), file_name="dashboard_timings.jsonl",
+                               mime="application/jsonl", use_container_width=True)
@@ -0,0 +1,107 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from analytics import MILESTONES, STAGES
+from projects import days_to_dates
+
+
+# ==============================================
+# 時間線 / Gantt（一個 Altair chart，不是每個專案一張卡片）
+# ==============================================
+# 少於這個數目的專案才在 y 軸顯示名稱，多的話用 zoom / pan 看
+LABELLED_ROWS = 60
+ROW_HEIGHT = 22
+SPAN = "Schedule"
+STAGE_COLORS = {SPAN: "#dddddd", "Installation": "#ffaa00", "Testing": "#66cc66", "Cleaning": "#00aa00", "Delivery": "#0066ff"}
+
+
+def _long(frame, names, starts, ends=None):
+    """寬表的幾個日期欄位 -> long format（每個專案每個階段 / 里程碑一行），沒有日期的不列出。"""
+    parts = []
+    for i, name in enumerate(names):
+        start = frame[starts[i]].to_numpy(dtype="float64", na_value=np.nan)
+        ok = ~np.isnan(start)
+        if ends is not None:
+            end = frame[ends[i]].to_numpy(dtype="float64", na_value=np.nan)
+            ok &= ~np.isnan(end)
+        pos = np.flatnonzero(ok)
+        part = pd.DataFrame({"pos": pos.astype("int32"), "kind": name,
+                             "start": days_to_dates(pd.Series(start[pos]))})
+        if ends is not None:
+            part["end"] = days_to_dates(pd.Series(end[pos]))
+        parts.append(part)
+    out = pd.concat(parts, ignore_index=True)
+    out["kind"] = pd.Categorical(out["kind"], categories=names)
+    return out
+
+
+class Timeline:
+    """一份 all_df 的時間線資料（long format），每個 snapshot 建一次。
+
+    bars：每個專案最早到最晚日期的淺灰色橫條（SPAN，按這條選取專案），
+    加上相鄰兩個里程碑之間的階段（跟 analytics.STAGES 一樣）；
+    marks：五個里程碑 + Lead_Time 的日期點。pos 是 all_df 的 row 位置，用來套用目前的篩選。
+    """
+
+    def __init__(self, frame):
+        self.size = len(frame)
+        days = frame[MILESTONES + ["Lead_Time"]].to_numpy(dtype="float64", na_value=np.nan)
+        known = ~np.isnan(days).all(axis=1)
+        span = pd.DataFrame({"first": np.nan, "last": np.nan}, index=range(self.size))
+        span.loc[known, "first"] = np.nanmin(days[known], axis=1)
+        span.loc[known, "last"] = np.nanmax(days[known], axis=1)
+        bars = _long(span, [SPAN], ["first"], ["last"]), \
+            _long(frame, list(STAGES), [s for s, _ in STAGES.values()], [e for _, e in STAGES.values()])
+        # 同一個 mark 依資料次序畫：SPAN 在最底
+        self.bars = pd.concat(bars, ignore_index=True)
+        self.bars["kind"] = pd.Categorical(self.bars["kind"], categories=list(STAGE_COLORS))
+        self.marks = _long(frame, MILESTONES + ["Lead_Time"], MILESTONES + ["Lead_Time"])
+        self.names = frame["Project_Name"].astype(str).to_numpy()
+        self.ids = frame["Project_ID"].astype(str).to_numpy()
+        self.progress = frame["progress"].to_numpy() if "progress" in frame else np.zeros(self.size, dtype=int)
+
+    def rows(self, positions):
+        """目前篩選 / 排序的專案 -> (bars, marks)，加上 row（畫面上的次序）、Project_ID 和 Project_Name。"""
+        row_of = np.full(self.size, -1, dtype="int32")
+        row_of[positions] = np.arange(len(positions), dtype="int32")
+        out = []
+        for table in (self.bars, self.marks):
+            table = table[row_of[table["pos"].to_numpy()] >= 0].copy()
+            table["row"] = row_of[table["pos"].to_numpy()]
+            table["Project_ID"] = self.ids[table["pos"].to_numpy()]
+            table["Project_Name"] = self.names[table["pos"].to_numpy()]
+            table["progress"] = self.progress[table["pos"].to_numpy()]
+            out.append(table)
+        return out
+
+    def chart(self, positions):
+        """Altair chart：階段是橫條、里程碑是點、Lead_Time 是紅色直線；x 軸可以 zoom / pan，
+        按一下橫條會選取那個專案（selection 名稱 "pick"，欄位 Project_ID；資料更新後也對得上）。"""
+        bars, marks = self.rows(positions)
+        n = len(positions)
+        if n <= LABELLED_ROWS:
+            y = alt.Y("Project_Name:N", sort=alt.SortField("row"), title=None)
+            height = max(n, 1) * ROW_HEIGHT + 40
+        else:
+            # 專案太多：y 是次序（可以 pan / zoom），名稱看 tooltip
+            y = alt.Y("row:Q", title=f"{n} projects (current sort order)", axis=alt.Axis(labels=False, ticks=False),
+                      scale=alt.Scale(reverse=True, domain=[-1, min(n, LABELLED_ROWS)]))
+            height = LABELLED_ROWS * ROW_HEIGHT
+        pick = alt.selection_point(name="pick", fields=["Project_ID"], on="click")
+        zoom = alt.selection_interval(bind="scales", encodings=["x"] if n <= LABELLED_ROWS else ["x", "y"])
+        tooltip = ["Project_Name:N", alt.Tooltip("kind:N", title="Stage / milestone"),
+                   alt.Tooltip("start:T", format="%Y-%m-%d"), alt.Tooltip("progress:Q", title="Progress %")]
+        stage_bars = alt.Chart(bars).mark_bar(height=ROW_HEIGHT * 0.6).encode(
+            x=alt.X("start:T", title=None), x2="end:T", y=y,
+            color=alt.Color("kind:N", title="Stage", scale=alt.Scale(domain=list(STAGE_COLORS),
+                                                                     range=list(STAGE_COLORS.values()))),
+            opacity=alt.condition(pick, alt.value(1.0), alt.value(0.35)),
+            tooltip=tooltip + [alt.Tooltip("end:T", format="%Y-%m-%d")],
+        ).add_params(pick, zoom)
+        milestone_marks = alt.Chart(marks[marks["kind"] != "Lead_Time"]).mark_point(filled=True, size=30, color="#333333").encode(
+            x="start:T", y=y, tooltip=tooltip)
+        lead_marks = alt.Chart(marks[marks["kind"] == "Lead_Time"]).mark_tick(color="#ff4444", thickness=2,
+                                                                               size=ROW_HEIGHT * 0.9).encode(
+            x="start:T", y=y, tooltip=tooltip)
+        return (stage_bars + milestone_marks + lead_marks).properties(height=height)
@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from persistence import ChangeSet, ConflictError, to_cell
+from storage import CHECKLIST_COLUMNS, PROJECT_COLUMNS, StorageBackend
+
+
+# ==============================================
+# 背景寫入佇列（write-behind）
+# ==============================================
+# table -> (欄位, key 欄位)
+TABLES = {"projects": (PROJECT_COLUMNS, "Project_ID"), "checklist": (CHECKLIST_COLUMNS, "Project_Name")}
+
+
+def is_quota_error(exc):
+    """Google Sheets API 超出配額（HTTP 429 / RESOURCE_EXHAUSTED）。"""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    text = str(exc)
+    return "429" in text or "Quota exceeded" in text or "RESOURCE_EXHAUSTED" in text
+
+
+def is_offline_error(exc):
+    """連不上網路（DNS / 連線 / 逾時）：不是資料的問題，連得上就寫得進去。"""
+    if isinstance(exc, (ConnectionError, TimeoutError, OSError)):
+        return True
+    # requests / google-auth / httplib2 的連線錯誤不一定繼承 OSError
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    return bool(names & {"ConnectionError", "Timeout", "TransportError", "ServerNotFoundError"})
+
+
+def apply_changes(frame, changes, columns, key="Project_Name"):
+    """把還沒寫入的改動疊到讀回來的原始 DataFrame 上（讀到自己剛寫的資料）。"""
+    if not changes:
+        return frame
+    frame = frame.astype(object)
+    if key not in frame.columns:
+        frame[key] = None
+    frame = frame[~frame[key].isin(changes.deleted)]
+    appended = list(changes.added.values())
+    for k, (record, fields) in changes.updated.items():
+        labels = frame.index[frame[key] == k]
+        if len(labels) == 0:
+            appended.append(record)
+            continue
+        for f in fields if fields is not None else columns:
+            if f in frame.columns:
+                frame.loc[labels, f] = to_cell(record.get(f))
+    if appended:
+        extra = pd.DataFrame([{c: to_cell(r.get(c)) for c in columns} for r in appended], columns=columns)
+        frame = pd.concat([frame, extra], ignore_index=True)
+    return frame
+
+
+class WriteBehindBackend(StorageBackend):
+    """包住另一個後端：save_* 立即回傳，改動在背景 thread 批次寫入。
+
+    同一個專案在寫入前的多次改動會合併成一次（ChangeSet.merge）。
+    寫入失敗會以指數退避重試；配額錯誤和連不上網路（offline）無限重試，其他錯誤重試 max_attempts 次後
+    放到 failed，等使用者按 Retry。讀取時會把待寫入 / 寫入中 / 失敗的改動疊上去。
+    編輯衝突（ConflictError）重試也沒用：沒衝突的部分已寫入，衝突記在 conflicts 給使用者看。
+    journal_path：還沒寫入的改動每次有變就存到這個 JSON 檔，重新啟動時載入繼續寫（離線時的改動不會不見）。
+    """
+
+    def __init__(self, backend, batch_delay=1.0, max_attempts=5, max_backoff=60.0, on_flush=None,
+                 journal_path=None):
+        self.backend = backend
+        # on_flush(table, n_changes, ms, ok)：每批寫完（或放棄）時呼叫，給計時用
+        self.on_flush = on_flush
+        self.label = backend.label
+        self.batch_delay = batch_delay
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._pending = {t: ChangeSet() for t in TABLES}
+        self._inflight = {t: ChangeSet() for t in TABLES}
+        self._failed = {t: ChangeSet() for t in TABLES}
+        self.last_error = None
+        self.last_sync = None
+        self.offline = False
+        self.conflicts = []
+        self._revision = 0
+        self._cond = threading.Condition()
+        self.journal_path = journal_path
+        self._load_journal()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # ---------- 讀取 ----------
+    def _overlay(self, table, frame):
+        with self._cond:
+            changes = ChangeSet()
+            for layer in (self._failed, self._inflight, self._pending):
+                changes.merge(layer[table])
+                if table == "checklist":
+                    # 跟著專案改動的 checklist（改名 / 刪除）
+                    for follow in layer["projects"].checklist.values():
+                        changes.merge(follow)
+        columns, key = TABLES[table]
+        return apply_changes(frame, changes, columns, key)
+
+    def read_projects(self):
+        return self._overlay("projects", self.backend.read_projects())
+
+    def read_checklist(self):
+        return self._overlay("checklist", self.backend.read_checklist())
+
+    def read_audit(self, project_id=None, since=None):
+        # 還在佇列裡的改動寫入後才有記錄
+        return self.backend.read_audit(project_id, since)
+
+    def refresh(self, *tables):
+        self.backend.refresh(*tables)
+
+    def change_token(self):
+        return self.backend.change_token()
+
+    def versions(self):
+        # local：本 process 送出的改動次數，讀取疊加的內容有變它就會變
+        return {**self.backend.versions(), "local": self._revision}
+
+    # ---------- 離線佇列存檔 ----------
+    def _load_journal(self):
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for table in TABLES:
+            for data in saved.get(table, []):
+                # 上次沒寫完的（包括失敗的）全部重新排隊
+                self._pending[table].merge(ChangeSet.from_json(data))
+        if any(self._pending.values()):
+            self._revision += 1
+
+    def _save_journal(self):
+        # 呼叫時要拿著 self._cond
+        if not self.journal_path:
+            return
+        saved = {t: [layer[t].to_json() for layer in (self._failed, self._inflight, self._pending) if layer[t]]
+                 for t in TABLES}
+        try:
+            if not any(saved.values()):
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                return
+            tmp = f"{self.journal_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(saved, f, ensure_ascii=False, default=str)
+            os.replace(tmp, self.journal_path)
+        except OSError as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+
+    # ---------- 寫入 ----------
+    def _submit(self, table, changes):
+        if not changes:
+            return
+        with self._cond:
+            self._pending[table].merge(changes)
+            self._revision += 1
+            self._save_journal()
+            self._cond.notify()
+
+    def save_projects(self, changes):
+        self._submit("projects", changes)
+
+    def commit_projects(self, changes):
+        # checklist 改動跟著專案一起排隊，背景寫入時由後端的 commit_projects 決定要不要寫
+        self._submit("projects", changes)
+
+    def save_checklist(self, changes):
+        self._submit("checklist", changes)
+
+    def retry_failed(self):
+        with self._cond:
+            for table in TABLES:
+                failed = self._failed[table]
+                failed.merge(self._pending[table])
+                self._pending[table] = failed
+                self._failed[table] = ChangeSet()
+            self.last_error = None
+            self._revision += 1
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            return {
+                "pending": sum(len(self._pending[t]) + len(self._inflight[t]) for t in TABLES),
+                "failed": sum(len(self._failed[t]) for t in TABLES),
+                "last_error": self.last_error,
+                "last_sync": self.last_sync,
+                "offline": self.offline,
+                "conflicts": list(self.conflicts),
+            }
+
+    def dismiss_conflicts(self):
+        with self._cond:
+            self.conflicts = []
+
+    # ---------- 背景 thread ----------
+    def _write(self, table, changes):
+        if table == "projects":
+            self.backend.commit_projects(changes)
+        else:
+            self.backend.save_checklist(changes)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(self._pending.values()):
+                    self._cond.wait()
+            # 等一下讓同一段時間內的改動合併成一批
+            time.sleep(self.batch_delay)
+            for table in TABLES:
+                with self._cond:
+                    batch = self._pending[table]
+                    self._pending[table] = ChangeSet()
+                    self._inflight[table] = batch
+                if batch:
+                    self._flush_batch(table, batch)
+                with self._cond:
+                    self._inflight[table] = ChangeSet()
+                    if batch:
+                        self._save_journal()
+                    self._cond.notify_all()
+
+    def _flush_batch(self, table, batch):
+        attempt = 0
+        t = time.perf_counter()
+        while True:
+            try:
+                self._write(table, batch)
+                self.last_sync = time.time()
+                self.last_error = None
+                self.offline = False
+                if self.on_flush:
+                    self.on_flush(table, len(batch), (time.perf_counter() - t) * 1000, True)
+                return
+            except ConflictError as exc:
+                with self._cond:
+                    self.conflicts = (self.conflicts + exc.conflicts)[-50:]
+                    self._revision += 1
+                self.last_sync = time.time()
+                self.last_error = None
+                if self.on_flush:
+                    self.on_flush(table, len(batch), (time.perf_counter() - t) * 1000, False)
+                return
+            except Exception as exc:
+                attempt += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                self.offline = is_offline_error(exc)
+                if not (is_quota_error(exc) or self.offline) and attempt >= self.max_attempts:
+                    with self._cond:
+                        self._failed[table].merge(batch)
+                    if self.on_flush:
+                        self.on_flush(table, len(batch), (time.perf_counter() - t) * 1000, False)
+                    return
+                time.sleep(min(self.max_backoff, 2 ** attempt))